@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Check of the NumPy IGRF (igrf.fieldXYZ) against the
+# compiled geomag70 program (geomag70.fieldXYZ).
+# @version 1.0
+#
+# The field is computed with both at random points
+# (dates, latitudes, longitudes and geocentric radii
+# within the range of the model) and
+# the largest difference of X, Y and Z is compared with
+# a tolerance. geomag70 rounds its output to 0.1 nT, so
+# the two should agree to about 0.05 nT. Run it after
+# any change to igrf.py; it exits with an error if the
+# difference is larger than the tolerance.
+#
+# geomag70.exe must be built first (see the README):
+#	gcc -lm geomag70_linux/geomag70.c -o geomag70_linux/geomag70.exe
+#
+# Usage:
+#	checkigrf.py [--points N] [--seed S] [--tolerance nT] [--executable FILE]
+#------------------------------------------------------
+
+import os
+import sys
+import optparse as op
+
+import numpy
+
+import igrf
+import geomag70
+
+# Largest difference allowed (nT)
+TOLERANCE = 0.1
+
+def randomPoints(n, seed=0):
+	"""Dates (decimal years), latitudes, longitudes (degrees) and
+	geocentric radii (km) of n random points within the model."""
+	rng = numpy.random.RandomState(seed)
+	model = igrf.loadModel()
+	first = float(numpy.min(model.yrmin))
+	last = float(numpy.max(model.yrmax))
+	dates = rng.uniform(first, last, n)
+	lat = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, n)))
+	lon = rng.uniform(-180.0, 180.0, n)
+	# altmin and altmax are altitudes above a sphere of 6371.2 km
+	alt = 6371.2 + rng.uniform(float(numpy.max(model.altmin)), float(numpy.min(model.altmax)), n)
+	return dates, lat, lon, alt
+
+def compare(n=300, seed=0, executable=geomag70.DEFAULT_EXE):
+	"""Largest difference (nT) of X, Y and Z between the two."""
+	dates, lat, lon, alt = randomPoints(n, seed)
+	numpyXYZ = igrf.fieldXYZ(dates, lat, lon, alt)
+	programXYZ = geomag70.fieldXYZ(dates, lat, lon, alt, executable=executable)
+	return max([float(numpy.max(numpy.abs(a - b))) for a, b in zip(numpyXYZ, programXYZ)])
+
+def main(argList):
+
+	p = op.OptionParser(usage='%prog [--points N] [--seed S] [--tolerance nT] [--executable FILE]')
+	p.add_option('--points', '-n', default=300, type='int', help='Number of random points [300 default]')
+	p.add_option('--seed', default=0, type='int', help='Seed of the random points [0 default]')
+	p.add_option('--tolerance', '-t', default=TOLERANCE, type='float', help='Largest difference allowed, nT [%g default]' % TOLERANCE)
+	p.add_option('--executable', default=geomag70.DEFAULT_EXE, type='string', help='geomag70 program [geomag70_linux/geomag70.exe default]')
+	ops, args = p.parse_args(argList)
+
+	if not os.path.exists(ops.executable):
+		p.error('%s is not built (see the README)' % ops.executable)
+	worst = compare(ops.points, ops.seed, ops.executable)
+	print('checkigrf: %d points, largest difference %.3f nT (tolerance %g nT)' % (ops.points, worst, ops.tolerance))
+	if worst > ops.tolerance:
+		sys.exit('checkigrf: igrf.fieldXYZ differs from geomag70 by %.3f nT' % worst)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
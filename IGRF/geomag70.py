@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# The compiled geomag70 program (geomag70.exe) driven
+# in batch, as a reference for igrf.fieldXYZ.
+# @version 1.0
+#
+# All the points of a job are written to one coordinate
+# file, the program is run once in its coordinate file
+# mode ('f'), and the rows of its output file are mapped
+# back to the points, so the cost of starting the
+# program and reading the model file is paid once per
+# job and not once per point. The coordinate and output
+# files of every call are in a new private directory
+# (made in 'scratchDir', or in the system's temporary
+# directory if it is None) that is removed afterwards,
+# so any number of runs can use the program at once.
+#
+# With pipeFieldXYZ the points are instead streamed to
+# long-lived geomag70 processes started in their 's'
+# mode (one coordinate line in, one result row out on
+# stdout), so that each point only costs a round trip
+# through a pipe. A small pool of them is shared by all
+# the threads of the process: requests are sent in
+# chunks, and a worker answers one chunk at a time in
+# order, so the rows of concurrent callers never mix.
+# The pool size is set with configure(poolSize=...).
+# A process forked after the pool has started gets a
+# new pool of its own.
+#
+# geomag70 stops reading the coordinate file at the
+# first line it does not accept (and then asks for the
+# values on the terminal), so dates, altitudes and
+# coordinates outside the range of the model are
+# rejected here with a ValueError before it is run.
+#
+# Input:
+#	epochs		dates of the points (datetime64,
+#			datetime or decimal years)
+#	lat		latitude (degrees)
+#	lon		longitude (degrees)
+#	alt		radius from the Earth's centre (km) if
+#			geocentric, else altitude above the
+#			WGS84 ellipsoid (km)
+# Output:
+#	X, Y, Z		northward, eastward and vertically
+#			downward components of the field (nT),
+#			rounded to 0.1 nT by the program
+#
+# Usage:
+#	X, Y, Z = geomag70.fieldXYZ(epochs, lat, lon, alt)
+#	X, Y, Z = geomag70.pipeFieldXYZ(epochs, lat, lon, alt)
+#------------------------------------------------------
+
+import os
+import atexit
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import numpy
+
+import igrf
+
+path = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_EXE = os.path.join(path, 'geomag70_linux', 'geomag70.exe')
+
+# Number of worker processes of pipeFieldXYZ, and number of
+# lines sent to a worker before its rows are read back (the
+# rows of a chunk must fit in the pipe buffer)
+poolSize = 2
+CHUNK = 200
+
+# Where the private directories of fieldXYZ are made
+scratchDir = None
+
+def coordinateLines(epochs, lat, lon, alt, geocentric=True):
+	"""Lines of a geomag70 coordinate file, one per point."""
+	epochs = numpy.asarray(epochs)
+	if epochs.dtype.kind in 'fiu':
+		dates = [repr(float(d)) for d in epochs.astype(float)]
+	else:
+		year, month, day = igrf.calendarDates(epochs)
+		dates = ['%d,%d,%d' % (y, m, d) for y, m, d in zip(year, month, day)]
+	if geocentric:
+		coord = 'C'
+	else:
+		coord = 'D'
+	return [''+d+' '+coord+' K'+repr(float(r))+' '+repr(float(la))+' '+repr(float(lo))+'\n'
+		for d, la, lo, r in zip(dates, lat, lon, alt)]
+
+def writeCoordinates(filename, epochs, lat, lon, alt, geocentric=True):
+	"""Write a geomag70 coordinate file, one line per point."""
+	f = open(filename, 'w')
+	try:
+		f.writelines(coordinateLines(epochs, lat, lon, alt, geocentric))
+	finally:
+		f.close()
+
+def parseRows(rows):
+	"""X, Y and Z columns of geomag70 result rows."""
+	# Counted from the end of the row, since the declination is
+	# printed as a single 'NaN' (instead of degrees and minutes)
+	# at the geographic poles
+	return numpy.array([[float(v) for v in row.split()[-11:-8]] for row in rows]).reshape(-1, 3)
+
+def readOutput(filename):
+	"""X, Y and Z columns of a geomag70 output file."""
+	f = open(filename, 'r')
+	try:
+		rows = f.readlines()[1:]
+	finally:
+		f.close()
+	return parseRows(rows)
+
+def checkRange(model, sdate, lat, lon, alt, geocentric=True):
+	"""Raise ValueError for points geomag70 would not accept."""
+	minalt = model.altmin.min()
+	maxalt = model.altmax.max()
+	if geocentric:
+		minalt = minalt + igrf.EARTHRADIUS
+		maxalt = maxalt + igrf.EARTHRADIUS
+	if numpy.any((sdate < model.yrmin.min()) | (sdate > model.yrmax.max()+1)):
+		raise ValueError('date outside the range of the model (%.2f to %.2f)' % (model.yrmin.min(), model.yrmax.max()+1))
+	if numpy.any((alt < minalt) | (alt > maxalt)):
+		raise ValueError('altitude outside the range of the model (%.2f to %.2f km)' % (minalt, maxalt))
+	if numpy.any((lat < -90.0) | (lat > 90.0)) or numpy.any((lon < -180.0) | (lon > 180.0)):
+		raise ValueError('latitude or longitude out of range')
+
+def _points(epochs, lat, lon, alt, geocentric, cofFile):
+	# flattened and checked points, and the shape of the result
+	epochs = numpy.asarray(epochs)
+	epochs, lat, lon, alt = numpy.broadcast_arrays(epochs, numpy.asarray(lat, dtype=float),
+		numpy.asarray(lon, dtype=float), numpy.asarray(alt, dtype=float))
+	shape = lat.shape
+	epochs, lat, lon, alt = epochs.ravel(), lat.ravel(), lon.ravel(), alt.ravel()
+	checkRange(igrf.loadModel(cofFile), igrf.decimalYears(epochs), lat, lon, alt, geocentric)
+	return epochs, lat, lon, alt, shape
+
+def _result(xyz, points, shape):
+	if len(xyz) != points:
+		raise RuntimeError('geomag70 returned %d rows for %d points' % (len(xyz), points))
+	return xyz[:, 0].reshape(shape), xyz[:, 1].reshape(shape), xyz[:, 2].reshape(shape)
+
+def fieldXYZ(epochs, lat, lon, alt, geocentric=True, cofFile=igrf.DEFAULT_COF, executable=DEFAULT_EXE):
+
+	epochs, lat, lon, alt, shape = _points(epochs, lat, lon, alt, geocentric, cofFile)
+
+	scratch = tempfile.mkdtemp(prefix='geomag70', dir=scratchDir)
+	try:
+		inputFile = os.path.join(scratch, 'input.txt')
+		outputFile = os.path.join(scratch, 'output.txt')
+		writeCoordinates(inputFile, epochs, lat, lon, alt, geocentric)
+		devnull = open(os.devnull, 'r+')
+		try:
+			status = subprocess.call([executable, cofFile, 'f', inputFile, outputFile],
+				stdin=devnull, stdout=devnull)
+		finally:
+			devnull.close()
+		if status != 0 or not os.path.exists(outputFile):
+			raise RuntimeError('geomag70 failed (exit status %d)' % status)
+		xyz = readOutput(outputFile)
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+
+	return _result(xyz, len(lat), shape)
+
+class Worker(object):
+	"""A geomag70 process in its 's' mode. evaluate() sends a chunk
+	of coordinate lines and reads back one row per line; a worker
+	serves one chunk at a time."""
+
+	def __init__(self, cofFile=igrf.DEFAULT_COF, executable=DEFAULT_EXE):
+		self.lock = threading.Lock()
+		devnull = open(os.devnull, 'w')
+		try:
+			self.process = subprocess.Popen([executable, cofFile, 's'], stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE, stderr=devnull, universal_newlines=True)
+		finally:
+			devnull.close()
+
+	def alive(self):
+		return self.process.poll() is None
+
+	def evaluate(self, lines):
+		rows = []
+		with self.lock:
+			try:
+				self.process.stdin.writelines(lines)
+				self.process.stdin.flush()
+				for line in lines:
+					row = self.process.stdout.readline()
+					if not row:
+						raise RuntimeError('geomag70 worker exited (is geomag70.exe built with the \'s\' option?)')
+					rows.append(row)
+			except (IOError, OSError):
+				self.close()
+				raise RuntimeError('geomag70 worker exited (is geomag70.exe built with the \'s\' option?)')
+			except:
+				# a worker left half way through a chunk is not reused
+				self.close()
+				raise
+		return rows
+
+	def close(self):
+		try:
+			self.process.stdin.close()
+		except (IOError, OSError):
+			pass
+		if self.process.poll() is None:
+			self.process.kill()
+		self.process.wait()
+		self.process.stdout.close()
+
+	def detach(self):
+		# in a forked child: drop this process' ends of the pipes,
+		# leaving the process to the parent
+		for f in (self.process.stdin, self.process.stdout):
+			try:
+				f.close()
+			except (IOError, OSError):
+				pass
+
+class WorkerPool(object):
+	"""'size' Workers started when first needed. The chunks of a
+	request are spread over the workers, and dead workers are
+	replaced."""
+
+	def __init__(self, size=poolSize, cofFile=igrf.DEFAULT_COF, executable=DEFAULT_EXE):
+		self.size = max(1, int(size))
+		self.cofFile = cofFile
+		self.executable = executable
+		self.workers = [None]*self.size
+		self.lock = threading.Lock()
+		self.next = 0
+
+	def _worker(self):
+		with self.lock:
+			k = self.next
+			self.next = (self.next + 1) % self.size
+			if self.workers[k] is None or not self.workers[k].alive():
+				self.workers[k] = Worker(self.cofFile, self.executable)
+			return self.workers[k]
+
+	def evaluate(self, lines):
+		chunks = [lines[k:k+CHUNK] for k in range(0, len(lines), CHUNK)]
+		if len(chunks) <= 1 or self.size == 1:
+			rows = []
+			for chunk in chunks:
+				rows.extend(self._worker().evaluate(chunk))
+			return rows
+
+		# one thread per worker, each sending every size-th chunk
+		results = [None]*len(chunks)
+		errors = []
+		def serve(first, worker):
+			try:
+				for k in range(first, len(chunks), self.size):
+					results[k] = worker.evaluate(chunks[k])
+			except Exception as e:
+				errors.append(e)
+		threads = [threading.Thread(target=serve, args=(k, self._worker())) for k in range(min(self.size, len(chunks)))]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		if errors:
+			raise errors[0]
+		return [row for chunk in results for row in chunk]
+
+	def close(self):
+		with self.lock:
+			for w in self.workers:
+				if w is not None:
+					w.close()
+			self.workers = [None]*self.size
+
+	def detach(self):
+		for w in self.workers:
+			if w is not None:
+				w.detach()
+		self.workers = [None]*self.size
+
+_pool = None
+_poolLock = threading.Lock()
+
+def getPool():
+	"""The WorkerPool shared by the whole process."""
+	global _pool
+	with _poolLock:
+		if _pool is None:
+			_pool = WorkerPool(poolSize)
+		return _pool
+
+def configure(poolSize=None):
+	"""Change the number of workers (the running ones are stopped)."""
+	g = globals()
+	with _poolLock:
+		if poolSize is not None:
+			g['poolSize'] = int(poolSize)
+		if g['_pool'] is not None:
+			g['_pool'].close()
+			g['_pool'] = None
+
+def closePool():
+	"""Stop the workers; they are started again when needed."""
+	configure()
+
+atexit.register(closePool)
+
+def _afterFork():
+	# a forked child must not share the parent's workers (their rows
+	# would mix with the parent's): it starts its own when needed
+	global _pool, _poolLock
+	if _pool is not None:
+		_pool.detach()
+	_pool = None
+	_poolLock = threading.Lock()
+
+os.register_at_fork(after_in_child=_afterFork)
+
+def pipeFieldXYZ(epochs, lat, lon, alt, geocentric=True):
+
+	epochs, lat, lon, alt, shape = _points(epochs, lat, lon, alt, geocentric, igrf.DEFAULT_COF)
+	rows = getPool().evaluate(coordinateLines(epochs, lat, lon, alt, geocentric))
+	return _result(parseRows(rows), len(lat), shape)
@@ -10,6 +10,14 @@
 /*                                                                          */
 /****************************************************************************/
 /*                                                                          */
+/*     ionFR changes:                                                       */
+/*     - 's' switch: coordinate lines are read from stdin and every result  */
+/*            row is written and flushed to stdout (all other messages go   */
+/*            to stderr), so the program can be kept running as a worker    */
+/*     - the model file headers are read only once with 'f' and 's'         */
+/*                                                                          */
+/****************************************************************************/
+/*                                                                          */
 /*     Version 7.0:                                                         */
 /*     - input file format changed to                                       */
 /*            -- accept new DGRF2005 coeffs with 0.01 nT precision          */
@@ -107,6 +115,7 @@
 #include <string.h>
 #include <ctype.h>
 #include <math.h> 
+#include <unistd.h>
 
 int my_isnan(double d)
 {
@@ -310,6 +319,7 @@ int main(int argc, char**argv)
   long  irec_pos[MAXMOD];
   
   int  coords_from_file = 0;
+  int  coords_from_stdin = 0;
   int arg_err = 0;
   int need_to_read_model = 1;
 
@@ -390,6 +400,7 @@ int main(int argc, char**argv)
       printf("interactive:     geomag\n");
       printf("command line:    geomag model_file date coord alt lat lon\n");
       printf("coordinate file: geomag model_file f input_file output_file\n");
+      printf("coordinate pipe: geomag model_file s\n");
       printf("or for help:     geomag h (or ? or -? or /?) \n");
       printf("\n");
       printf("Date and location Formats: \n");
@@ -438,6 +449,19 @@ int main(int argc, char**argv)
       fprintf(outfile,"Date Coord-System Altitude Latitude Longitude D_deg D_min I_deg I_min H_nT X_nT Y_nT Z_nT F_nT dD_min dI_min dH_nT dX_nT dY_nT dZ_nT dF_nT\n");
     } /* file option */
 
+  if ((argc==3)&&(*(args[2])=='s'))
+    {
+      /* Same as 'f', one result row per line of stdin, without the header
+         line; stdout is kept for the rows and everything else is printed
+         to stderr */
+      coords_from_file = 1;
+      coords_from_stdin = 1;
+      coordfile=stdin;
+      outfile=fdopen(dup(fileno(stdout)), "w");
+      dup2(fileno(stderr), fileno(stdout));
+      argc = 7;
+    } /* pipe option */
+
   if (argc>=3 && argc !=5 && *(args[2])=='f')
     {
       printf("\n\nERROR in 'f' switch option: wrong number of arguments\n");
@@ -736,6 +760,7 @@ int main(int argc, char**argv)
           
           nmodel = modelI + 1;
           fclose(stream);
+          if (coords_from_file) need_to_read_model = 0;
           
           /* if date specified in command line then warn if past end of validity */
           
@@ -1220,6 +1245,7 @@ int main(int argc, char**argv)
       if (coords_from_file)
         {
           print_result_file(outfile, d, i, h, x, y, z, f,ddot,idot,hdot,xdot,ydot,zdot,fdot);
+          if (coords_from_stdin) fflush(outfile);
         }  
       else
         {    
@@ -0,0 +1,160 @@
+/****************************************************************************/
+/*                                                                          */
+/*     geomag70lib.c: geomag70 as a shared library (for ctypes)             */
+/*                                                                          */
+/*     The numerical routines of geomag70.c (getshc, interpsh, extrapsh     */
+/*     and shval3) are used unchanged; its main() is renamed so that it     */
+/*     does not clash with the caller's. geomag70_field() evaluates the     */
+/*     field at N points in one call and fills the caller's arrays, so      */
+/*     no text is formatted or parsed.                                      */
+/*                                                                          */
+/*     Build (see IGRF/geomag70lib.py):                                     */
+/*        gcc -O2 -shared -fPIC geomag70lib.c -o libgeomag70.so -lm         */
+/*                                                                          */
+/****************************************************************************/
+
+#define main geomag70_main
+#include "geomag70.c"
+#undef main
+
+/****************************************************************************/
+/*                                                                          */
+/*                       Subroutine geomag70_field                          */
+/*                                                                          */
+/****************************************************************************/
+/*                                                                          */
+/*     Computes X, Y and Z (nT) at n points, as geomag70 does in its        */
+/*     coordinate file mode (without the rounding of the output).           */
+/*                                                                          */
+/*     Input:                                                               */
+/*           mdfile   - model file name (e.g. IGRF13.COF)                   */
+/*           n        - number of points                                    */
+/*           sdate    - decimal year of every point (see julday)            */
+/*           lat, lon - coordinates of every point (degrees)                */
+/*           alt      - radius (km) if igdgc=2, altitude above the          */
+/*                      WGS84 ellipsoid (km) if igdgc=1                     */
+/*           igdgc    - 1 geodetic, 2 geocentric                            */
+/*                                                                          */
+/*     Output:                                                              */
+/*           x, y, z  - field components of every point (X and Y are NaN    */
+/*                      at the geographic poles)                            */
+/*                                                                          */
+/*     Returns 0, or -1 if the model file cannot be read, or k+1 if the     */
+/*     date of point k is outside the models of the file.                   */
+/*                                                                          */
+/*     Coefficients are only computed again when the date changes from      */
+/*     one point to the next (and only read from the file again when the    */
+/*     model changes), so points should be sorted by date.                  */
+/*                                                                          */
+/****************************************************************************/
+
+int geomag70_field(const char *mdfile, int n, const double *sdate,
+                   const double *lat, const double *lon, const double *alt,
+                   int igdgc, double *xout, double *yout, double *zout)
+{
+  char  file[PATH];
+  char  inbuff[MAXINBUFF];
+  char  name[MAXMOD][9];
+  long  irec_pos[MAXMOD];
+  int   max1[MAXMOD];
+  int   max2[MAXMOD];
+  int   max3[MAXMOD];
+  double epoch[MAXMOD];
+  double yrmin[MAXMOD];
+  double yrmax[MAXMOD];
+  double altmin[MAXMOD];
+  double altmax[MAXMOD];
+  double lastdate = -1;
+  int   lastmodel = -1;
+  int   nmodel, modelI, nmax = 0;
+  int   k;
+  FILE *mf;
+
+  strncpy(file, mdfile, PATH-1);
+  file[PATH-1] = '\0';
+
+  /* Read the model headers once */
+  if (!(mf = fopen(file, "rt")))
+    return -1;
+  modelI = -1;
+  while (fgets(inbuff, MAXREAD, mf))
+    {
+      if (strlen(inbuff) != RECL)
+        {
+          fclose(mf);
+          return -1;
+        }
+      if (!strncmp(inbuff, "   ", 3))
+        {
+          modelI++;
+          if (modelI >= MAXMOD)
+            {
+              fclose(mf);
+              return -1;
+            }
+          irec_pos[modelI] = ftell(mf);
+          sscanf(inbuff, "%8s%lg%d%d%d%lg%lg%lg%lg", name[modelI], &epoch[modelI],
+                 &max1[modelI], &max2[modelI], &max3[modelI], &yrmin[modelI],
+                 &yrmax[modelI], &altmin[modelI], &altmax[modelI]);
+        }
+    }
+  fclose(mf);
+  nmodel = modelI + 1;
+  if (nmodel < 1)
+    return -1;
+
+  for (k = 0; k < n; k++)
+    {
+      if (sdate[k] != lastdate)
+        {
+          if (sdate[k] < yrmin[0] || sdate[k] > yrmax[nmodel-1]+1)
+            return k+1;
+
+          /* Pick model: if beyond end of last model use last model */
+          for (modelI = 0; modelI < nmodel; modelI++)
+            if (sdate[k] < yrmax[modelI]) break;
+          if (modelI == nmodel) modelI--;
+
+          /* gh1 and gh2 only depend on the model, and are only read
+             by interpsh and extrapsh */
+          if (modelI != lastmodel && max2[modelI] == 0)
+            {
+              getshc(file, 1, irec_pos[modelI], max1[modelI], 1);
+              getshc(file, 1, irec_pos[modelI+1], max1[modelI+1], 2);
+            }
+          else if (modelI != lastmodel)
+            {
+              getshc(file, 1, irec_pos[modelI], max1[modelI], 1);
+              getshc(file, 0, irec_pos[modelI], max2[modelI], 2);
+            }
+          lastmodel = modelI;
+
+          if (max2[modelI] == 0)
+            {
+              nmax = interpsh(sdate[k], yrmin[modelI], max1[modelI],
+                              yrmin[modelI+1], max1[modelI+1], 3);
+            }
+          else
+            {
+              nmax = extrapsh(sdate[k], epoch[modelI], max1[modelI], max2[modelI], 3);
+            }
+          lastdate = sdate[k];
+        }
+
+      shval3(igdgc, lat[k], lon[k], alt[k], nmax, 3,
+             IEXT, EXT_COEFF1, EXT_COEFF2, EXT_COEFF3);
+
+      if (90.0-fabs(lat[k]) <= 0.001) /* at geographic poles */
+        {
+          xout[k] = NaN;
+          yout[k] = NaN;
+        }
+      else
+        {
+          xout[k] = x;
+          yout[k] = y;
+        }
+      zout[k] = z;
+    }
+  return 0;
+}
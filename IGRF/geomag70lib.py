@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# geomag70.c called through ctypes, with arrays.
+# @version 1.0
+#
+# geomag70lib.c builds geomag70.c as a shared library
+# (libgeomag70.so in IGRF/geomag70_linux/) with one
+# entry point, geomag70_field, that fills X, Y and Z
+# arrays for N points in a single call. The values
+# cross from C to Python as doubles: nothing is
+# formatted or parsed, and they are not rounded to
+# 0.1 nT as in the output of geomag70.exe.
+#
+# The library is built with build() (or by hand, see
+# geomag70lib.c). The C routines keep their state in
+# global variables, so calls are serialized with a
+# lock.
+#
+# Input:
+#	epochs		dates of the points (datetime64,
+#			datetime or decimal years)
+#	lat		latitude (degrees)
+#	lon		longitude (degrees)
+#	alt		radius from the Earth's centre (km) if
+#			geocentric, else altitude above the
+#			WGS84 ellipsoid (km)
+# Output:
+#	X, Y, Z		northward, eastward and vertically
+#			downward components of the field (nT)
+#
+# Usage:
+#	geomag70lib.build()
+#	X, Y, Z = geomag70lib.fieldXYZ(epochs, lat, lon, alt)
+#------------------------------------------------------
+
+import os
+import ctypes
+import subprocess
+import tempfile
+import threading
+
+import numpy
+
+import igrf
+
+path = os.path.dirname(os.path.realpath(__file__))
+SOURCE = os.path.join(path, 'geomag70_linux', 'geomag70lib.c')
+LIBRARY = os.path.join(path, 'geomag70_linux', 'libgeomag70.so')
+
+_lib = None
+_lock = threading.Lock()
+
+def build(compiler='gcc'):
+	"""Compile geomag70lib.c into LIBRARY."""
+	# built under a private name and then renamed, so that runs
+	# loading the library never see a partly written file
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(LIBRARY), suffix='.so.tmp')
+	os.close(fd)
+	try:
+		status = subprocess.call([compiler, '-O2', '-shared', '-fPIC', SOURCE, '-o', tmp, '-lm'])
+		if status != 0:
+			raise RuntimeError('could not build %s (exit status %d)' % (LIBRARY, status))
+		os.chmod(tmp, 0o755)
+		os.replace(tmp, LIBRARY)
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+
+def load():
+	"""The library, loaded the first time it is needed."""
+	global _lib
+	with _lock:
+		if _lib is None:
+			if not os.path.exists(LIBRARY):
+				raise OSError('%s not found, build it with geomag70lib.build()' % LIBRARY)
+			lib = ctypes.CDLL(LIBRARY)
+			array = numpy.ctypeslib.ndpointer(dtype=numpy.float64, flags='C_CONTIGUOUS')
+			lib.geomag70_field.argtypes = [ctypes.c_char_p, ctypes.c_int, array, array, array, array,
+				ctypes.c_int, array, array, array]
+			lib.geomag70_field.restype = ctypes.c_int
+			_lib = lib
+		return _lib
+
+def fieldXYZ(epochs, lat, lon, alt, geocentric=True, cofFile=igrf.DEFAULT_COF):
+
+	lib = load()
+
+	sdate, lat, lon, alt = numpy.broadcast_arrays(igrf.decimalYears(epochs),
+		numpy.asarray(lat, dtype=float), numpy.asarray(lon, dtype=float), numpy.asarray(alt, dtype=float))
+	shape = lat.shape
+
+	# sorted by date, so that the coefficients are computed once per date
+	order = numpy.argsort(sdate.ravel(), kind='stable')
+	points = [numpy.ascontiguousarray(a.ravel()[order], dtype=numpy.float64) for a in (sdate, lat, lon, alt)]
+	n = len(order)
+	x = numpy.empty(n)
+	y = numpy.empty(n)
+	z = numpy.empty(n)
+	if geocentric:
+		igdgc = 2
+	else:
+		igdgc = 1
+
+	with _lock:
+		status = lib.geomag70_field(cofFile.encode(), n, points[0], points[1], points[2], points[3],
+			igdgc, x, y, z)
+	if status == -1:
+		raise IOError('could not read the model file %s' % cofFile)
+	if status > 0:
+		raise ValueError('date %.2f outside the range of the model' % points[0][status-1])
+
+	X = numpy.empty(n)
+	Y = numpy.empty(n)
+	Z = numpy.empty(n)
+	X[order] = x
+	Y[order] = y
+	Z[order] = z
+	return X.reshape(shape), Y.reshape(shape), Z.reshape(shape)
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# In-process IGRF field synthesis with NumPy.
+# @version 1.0
+#
+# This is the spherical harmonic synthesis done by
+# geomag70.c (getshc, interpsh/extrapsh and shval3),
+# applied to arrays of points at once, so that no
+# process has to be spawned and no text files written.
+# The model file (IGRF13.COF) is read only once per
+# process.
+#
+# As in geomag70, the date of every point is used as a
+# decimal year computed from its year, month and day
+# (see julday), the coefficients of the two surrounding
+# models are interpolated in time (or the last model is
+# extrapolated with its secular variation), and X, Y
+# and Z are given in nT. The only difference with the
+# program's output is that the values are not rounded
+# to 0.1 nT.
+#
+# The model file is parsed once (loadModel), and the
+# coefficients interpolated to every date are kept in
+# a least recently used cache of 'maxCoefficientSets'
+# dates, so a run over many days only computes them
+# once per distinct day. The number of hits, misses
+# and evictions are kept in 'stats'.
+#
+# Input:
+#	epochs		dates of the points (datetime64,
+#			datetime or decimal years)
+#	lat		latitude (degrees)
+#	lon		longitude (degrees)
+#	alt		radius from the Earth's centre (km) if
+#			geocentric, else altitude above the
+#			WGS84 ellipsoid (km)
+# Output:
+#	X, Y, Z		northward, eastward and vertically
+#			downward components of the field (nT)
+#------------------------------------------------------
+
+import os
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy
+
+path = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_COF = os.path.join(path, 'geomag70_linux', 'IGRF13.COF')
+
+MAXDEG = 13
+NCOEFF = MAXDEG*(MAXDEG+2)
+
+# Size of the cache of coefficients, in dates (a set of
+# coefficients takes 1.5 kB)
+maxCoefficientSets = 4096
+
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+_coefficientSets = OrderedDict()
+_lock = threading.RLock()
+
+# Constants exactly as used by shval3 in geomag70.c
+EARTHRADIUS = 6371.2 # km
+DTR = 0.01745329
+A2 = 40680631.59 # WGS84
+B2 = 40408299.98 # WGS84
+
+class IGRFModel(object):
+	"""Contents of a geomag70 model (.COF) file.
+
+	For model i: names[i], epoch[i], max1[i] (degree of the
+	main field), max2[i] (degree of the secular variation,
+	0 if none), yrmin[i], yrmax[i], altmin[i], altmax[i]
+	(km), gh[i] (main field coefficients) and sv[i]
+	(secular variation). The
+	coefficients are ordered as in getshc (g, then h when
+	m > 0, for n = 1..MAXDEG and m = 0..n) and padded with
+	zeros up to MAXDEG.
+	"""
+
+	def __init__(self, names, epoch, max1, max2, yrmin, yrmax, altmin, altmax, gh, sv, filename=None):
+		self.names = names
+		self.epoch = epoch
+		self.max1 = max1
+		self.max2 = max2
+		self.yrmin = yrmin
+		self.yrmax = yrmax
+		self.altmin = altmin
+		self.altmax = altmax
+		self.gh = gh
+		self.sv = sv
+		self.filename = filename
+
+def readCOF(filename=DEFAULT_COF):
+
+	names = []
+	header = []
+	blocks = []
+	f = open(filename, 'r')
+	try:
+		for line in f:
+			if not line.strip():
+				continue
+			if line.startswith('   '):
+				# a new model: name, epoch, max1, max2, max3, yrmin, yrmax, altmin, altmax
+				fields = line.split()
+				names.append(fields[0])
+				header.append([float(x) for x in fields[1:9]])
+				blocks.append([])
+			else:
+				blocks[-1].append(line.split()[:6])
+	finally:
+		f.close()
+
+	header = numpy.array(header)
+	gh = numpy.zeros((len(names), NCOEFF))
+	sv = numpy.zeros((len(names), NCOEFF))
+	for i, block in enumerate(blocks):
+		ii = 0
+		for n, m, g, h, gdot, hdot in block:
+			if int(m) == 0:
+				gh[i, ii], sv[i, ii] = float(g), float(gdot)
+				ii = ii + 1
+			else:
+				gh[i, ii], sv[i, ii] = float(g), float(gdot)
+				gh[i, ii+1], sv[i, ii+1] = float(h), float(hdot)
+				ii = ii + 2
+		# the secular variation only goes up to degree max2
+		sv[i, int(header[i, 2])*(int(header[i, 2])+2):] = 0.0
+
+	return IGRFModel(names, header[:, 0], header[:, 1].astype(int), header[:, 2].astype(int),
+		header[:, 4], header[:, 5], header[:, 6], header[:, 7], gh, sv, filename)
+
+_models = {}
+
+def loadModel(filename=DEFAULT_COF):
+	"""IGRFModel of a .COF file, read only the first time."""
+	key = os.path.realpath(filename)
+	model = _models.get(key)
+	if model is None:
+		model = readCOF(filename)
+		_models[key] = model
+	return model
+
+def julday(year, month, day):
+	"""Decimal year of a date, as computed by geomag70's julday."""
+	year = numpy.asarray(year, dtype=int)
+	month = numpy.asarray(month, dtype=int)
+	day = numpy.asarray(day, dtype=int)
+	days = numpy.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334])
+	leap = ((year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))).astype(int)
+	dayInYear = days[month-1] + day + numpy.where(month > 2, leap, 0)
+	return year + dayInYear/(365.0 + leap)
+
+def calendarDates(epochs):
+	"""(year, month, day) arrays of datetime64/datetime dates."""
+	epochs = numpy.asarray(epochs)
+	if epochs.dtype == object:
+		epochs = numpy.array([numpy.datetime64(e.replace(tzinfo=None) if isinstance(e, datetime.datetime) else e, 'D')
+			for e in epochs.ravel()]).reshape(epochs.shape)
+	days = epochs.astype('datetime64[D]')
+	years = days.astype('datetime64[Y]')
+	months = days.astype('datetime64[M]')
+	year = years.astype(int) + 1970
+	month = (months - years.astype('datetime64[M]')).astype(int) + 1
+	day = (days - months.astype('datetime64[D]')).astype(int) + 1
+	return year, month, day
+
+def decimalYears(epochs):
+	"""Decimal years (julday) of datetime64/datetime dates; numbers
+	are taken to be decimal years already."""
+	epochs = numpy.asarray(epochs)
+	if epochs.dtype.kind in 'fiu':
+		return epochs.astype(float)
+	year, month, day = calendarDates(epochs)
+	return julday(year, month, day)
+
+def coefficients(model, sdate):
+	"""Coefficients (gh) of 'model' at the decimal year sdate, and
+	their maximum degree, as interpsh/extrapsh in geomag70."""
+	# Pick model: if beyond end of last model use last model
+	later = numpy.nonzero(sdate < model.yrmax)[0]
+	if len(later):
+		i = later[0]
+	else:
+		i = len(model.yrmax) - 1
+
+	if model.max2[i] == 0:
+		# interpolate to the next model (interpsh). The padding
+		# with zeros gives the same coefficients as geomag70 when
+		# the two models have a different degree
+		factor = (sdate - model.yrmin[i])/(model.yrmin[i+1] - model.yrmin[i])
+		gh = model.gh[i] + factor*(model.gh[i+1] - model.gh[i])
+		nmax = max(model.max1[i], model.max1[i+1])
+	else:
+		# extrapolate with the secular variation (extrapsh)
+		factor = sdate - model.epoch[i]
+		gh = model.gh[i] + factor*model.sv[i]
+		nmax = max(model.max1[i], model.max2[i])
+	return gh, nmax
+
+def cachedCoefficients(model, sdate):
+	"""coefficients(model, sdate) through the LRU cache. The array
+	returned is shared, and read-only."""
+	key = (model, float(sdate))
+	with _lock:
+		entry = _coefficientSets.get(key)
+		if entry is not None:
+			_coefficientSets.move_to_end(key)
+			stats['hits'] += 1
+			return entry
+		stats['misses'] += 1
+	gh, nmax = coefficients(model, sdate)
+	gh.setflags(write=False)
+	with _lock:
+		_coefficientSets[key] = (gh, nmax)
+		_coefficientSets.move_to_end(key)
+		while len(_coefficientSets) > max(1, maxCoefficientSets):
+			_coefficientSets.popitem(last=False)
+			stats['evictions'] += 1
+	return gh, nmax
+
+def configure(maxCoefficientSets=None):
+	"""Change the size of the cache of coefficients."""
+	g = globals()
+	with _lock:
+		if maxCoefficientSets is not None:
+			g['maxCoefficientSets'] = int(maxCoefficientSets)
+		while len(_coefficientSets) > max(1, g['maxCoefficientSets']):
+			_coefficientSets.popitem(last=False)
+			stats['evictions'] += 1
+
+def clearCache():
+	"""Drop the cached coefficients and reset the counters."""
+	with _lock:
+		_coefficientSets.clear()
+		for k in stats:
+			stats[k] = 0
+
+def shval3(lat, lon, alt, gh, nmax, geocentric=True, index=None):
+	"""Field components as shval3 in geomag70. gh[coeff] is used for
+	every point; with 'index', point n uses gh[index[n], coeff]."""
+
+	flat = numpy.asarray(lat, dtype=float)
+	flon = numpy.asarray(lon, dtype=float)
+	r = numpy.asarray(alt, dtype=float)
+	gh = numpy.asarray(gh, dtype=float)
+
+	slat = numpy.sin(flat*DTR)
+	# 300 ft. from the poles
+	aa = numpy.where((90.0 - flat) < 0.001, 89.999, numpy.where((90.0 + flat) < 0.001, -89.999, flat))
+	clat = numpy.cos(aa*DTR)
+	sl = numpy.zeros((MAXDEG+1,) + flon.shape)
+	cl = numpy.zeros((MAXDEG+1,) + flon.shape)
+	sl[1] = numpy.sin(flon*DTR)
+	cl[1] = numpy.cos(flon*DTR)
+
+	x = 0.0
+	y = 0.0
+	z = 0.0
+	sd = 0.0
+	cd = 1.0
+	if not geocentric:
+		aa = A2*clat*clat
+		bb = B2*slat*slat
+		cc = aa + bb
+		dd = numpy.sqrt(cc)
+		r = numpy.sqrt(alt*(alt + 2.0*dd) + (A2*aa + B2*bb)/cc)
+		cd = (alt + dd)/r
+		sd = (A2 - B2)/dd*slat*clat/r
+		aa = slat
+		slat = slat*cd - clat*sd
+		clat = clat*cd + aa*sd
+
+	if index is None:
+		coefficient = lambda l: gh[l]
+	else:
+		coefficient = lambda l: gh[index, l]
+
+	ratio = EARTHRADIUS/r
+	npq = (nmax*(nmax + 3))//2
+	p = [None]*(npq+1)
+	q = [None]*(npq+1)
+	p[1] = 2.0*slat
+	p[2] = 2.0*clat
+	p[3] = 4.5*slat*slat - 1.5
+	p[4] = 3.0*numpy.sqrt(3.0)*clat*slat
+	q[1] = -clat
+	q[2] = slat
+	q[3] = -3.0*clat*slat
+	q[4] = numpy.sqrt(3.0)*(slat*slat - clat*clat)
+
+	l = 0 # gh is indexed from 0 here, from 1 in geomag70
+	n = 0
+	m = 1
+	for k in range(1, npq+1):
+		if n < m:
+			m = 0
+			n = n + 1
+			rr = ratio**(n + 2)
+			fn = float(n)
+		fm = float(m)
+		if k >= 5:
+			if m == n:
+				aa = numpy.sqrt(1.0 - 0.5/fm)
+				j = k - n - 1
+				p[k] = (1.0 + 1.0/fm)*aa*clat*p[j]
+				q[k] = aa*(clat*q[j] + slat/fm*p[j])
+				sl[m] = sl[m-1]*cl[1] + cl[m-1]*sl[1]
+				cl[m] = cl[m-1]*cl[1] - sl[m-1]*sl[1]
+			else:
+				aa = numpy.sqrt(fn*fn - fm*fm)
+				bb = numpy.sqrt((fn - 1.0)*(fn - 1.0) - fm*fm)/aa
+				cc = (2.0*fn - 1.0)/aa
+				ii = k - n
+				j = k - 2*n + 1
+				p[k] = (fn + 1.0)*(cc*slat/fn*p[ii] - bb/(fn - 1.0)*p[j])
+				q[k] = cc*(slat*q[ii] - clat/fn*p[ii]) - bb*q[j]
+		aa = rr*coefficient(l)
+		if m == 0:
+			x = x + aa*q[k]
+			z = z - aa*p[k]
+			l = l + 1
+		else:
+			bb = rr*coefficient(l+1)
+			cc = aa*cl[m] + bb*sl[m]
+			x = x + cc*q[k]
+			z = z - cc*p[k]
+			y = y + numpy.where(clat > 0, (aa*sl[m] - bb*cl[m])*fm*p[k]/((fn + 1.0)*clat),
+				(aa*sl[m] - bb*cl[m])*q[k]*slat)
+			l = l + 2
+		m = m + 1
+
+	aa = x
+	x = x*cd + z*sd
+	z = z*cd - aa*sd
+
+	# X and Y are not defined at the geographic poles
+	pole = (90.0 - numpy.abs(flat)) <= 0.001
+	x = numpy.where(pole, numpy.nan, x)
+	y = numpy.where(pole, numpy.nan, y)
+	return x, y, z
+
+def fieldXYZ(epochs, lat, lon, alt, geocentric=True, model=None):
+
+	if model is None:
+		model = loadModel()
+
+	sdate, lat, lon, alt = numpy.broadcast_arrays(decimalYears(epochs),
+		numpy.asarray(lat, dtype=float), numpy.asarray(lon, dtype=float), numpy.asarray(alt, dtype=float))
+
+	if sdate.size == 0:
+		return numpy.zeros(sdate.shape), numpy.zeros(sdate.shape), numpy.zeros(sdate.shape)
+
+	# the coefficients are taken once per distinct date
+	dates, inverse = numpy.unique(sdate, return_inverse=True)
+	sets = [cachedCoefficients(model, d) for d in dates]
+	nmax = max([s[1] for s in sets])
+	if len(sets) == 1:
+		return shval3(lat, lon, alt, sets[0][0], nmax, geocentric)
+	gh = numpy.array([s[0] for s in sets])
+	return shval3(lat, lon, alt, gh, nmax, geocentric, inverse.reshape(sdate.shape))
+
+# Implementation used by field(): 'numpy' (fieldXYZ above),
+# 'geomag70' (the compiled program run once per call),
+# 'geomag70-pipe' (long-lived geomag70 processes, see geomag70.py),
+# 'geomag70-lib' (geomag70.c through ctypes, see geomag70lib.py) or
+# 'grid' (interpolated in precomputed grids, see fieldgrid.py).
+# Can be set with the IONFR_IGRF environment variable.
+defaultBackend = os.environ.get('IONFR_IGRF', 'numpy')
+
+def field(epochs, lat, lon, alt, geocentric=True, backend=None):
+	"""X, Y, Z (nT) of all the points with the chosen backend."""
+	if backend is None:
+		backend = defaultBackend
+	if backend == 'numpy':
+		return fieldXYZ(epochs, lat, lon, alt, geocentric)
+	if backend == 'geomag70':
+		import geomag70
+		return geomag70.fieldXYZ(epochs, lat, lon, alt, geocentric)
+	if backend == 'geomag70-pipe':
+		import geomag70
+		return geomag70.pipeFieldXYZ(epochs, lat, lon, alt, geocentric)
+	if backend == 'geomag70-lib':
+		import geomag70lib
+		return geomag70lib.fieldXYZ(epochs, lat, lon, alt, geocentric)
+	if backend == 'grid':
+		if not geocentric:
+			raise ValueError('the grid backend only takes geocentric radii')
+		import fieldgrid
+		return fieldgrid.fieldXYZ(epochs, lat, lon, alt)
+	raise ValueError('unknown IGRF backend %r' % backend)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# In-process cache of parsed IONEX files and of their
+# time-interpolated maps.
+# @version 1.0
+#
+# A file is identified by its real path, its size and
+# its modification time, so an IONEX file that is
+# replaced on disk is parsed again. The least recently
+# used files are dropped once more than 'maxEntries'
+# files, or more than 'maxBytes' bytes of maps, are
+# held. The number of hits, misses and evictions are
+# kept in 'stats'. On a miss the file is loaded through
+# ionexsidecar, i.e. from its binary sidecar if there
+# is an up to date one.
+#
+# Usage:
+#	data = ionexcache.getIONEX(filename)
+#	maps = ionexcache.interpolatedMaps(data, 'tec')
+#	ionexcache.configure(maxEntries=4, maxBytes=256*2**20)
+#
+# Files can also be put in the cache by ionexshared
+# (insert/discard), when they are mapped from memory
+# shared with other processes.
+#------------------------------------------------------
+
+import os
+import threading
+from collections import OrderedDict
+
+import ionexread
+import ionexsidecar
+import mapinterp
+
+# Default limits: a day of CODE maps takes about 0.5 MB
+# parsed, and about 2 MB more once interpolated
+maxEntries = 8
+maxBytes = 512*1024*1024
+
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+_entries = OrderedDict()
+_lock = threading.RLock()
+
+def fileKey(filename):
+	"""Identity of an IONEX file: (real path, size, mtime)."""
+	st = os.stat(filename)
+	return (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+
+def _sizeOf(data):
+	size = data.tec.nbytes
+	if data.rms is not None:
+		size += data.rms.nbytes
+	for cube in data.maps.values():
+		size += cube.nbytes
+	return size
+
+def _evict():
+	# never drop the entry that has just been used
+	while len(_entries) > 1:
+		total = sum([_sizeOf(d) for d in _entries.values()])
+		if len(_entries) <= maxEntries and total <= maxBytes:
+			break
+		_entries.popitem(last=False)
+		stats['evictions'] += 1
+
+def configure(maxEntries=None, maxBytes=None):
+	"""Change the eviction limits of the cache."""
+	g = globals()
+	with _lock:
+		if maxEntries is not None:
+			g['maxEntries'] = int(maxEntries)
+		if maxBytes is not None:
+			g['maxBytes'] = int(maxBytes)
+		_evict()
+
+def clear():
+	"""Drop every cached file and reset the counters."""
+	with _lock:
+		_entries.clear()
+		for k in stats:
+			stats[k] = 0
+
+def getIONEX(filename):
+	"""Parsed IONEX file, read from disk only on a cache miss.
+
+	An IONEXData instance given instead of a file name is
+	returned unchanged.
+	"""
+	if isinstance(filename, ionexread.IONEXData):
+		return filename
+	key = fileKey(filename)
+	with _lock:
+		data = _entries.get(key)
+		if data is not None:
+			_entries.move_to_end(key)
+			stats['hits'] += 1
+			return data
+		stats['misses'] += 1
+	data = ionexsidecar.loadIONEX(filename)
+	with _lock:
+		_entries[key] = data
+		_evict()
+	return data
+
+def insert(key, data):
+	"""Put an IONEXData in the cache under a fileKey() (used by
+	ionexshared for files mapped from shared memory)."""
+	with _lock:
+		_entries[key] = data
+		_entries.move_to_end(key)
+		_evict()
+
+def discard(key, data=None):
+	"""Drop the entry of a fileKey() (only if it is 'data', when
+	given)."""
+	with _lock:
+		if key in _entries and (data is None or _entries[key] is data):
+			del _entries[key]
+
+def interpolatedMaps(data, kind='tec'):
+	"""Hourly 'tec' or 'rms' maps of an IONEX file, interpolated
+	in time by mapinterp.
+
+	The maps are computed once per IONEXData and kept with it,
+	so they leave the cache together with the parsed file.
+	"""
+	data = getIONEX(data)
+	cube = data.maps.get(kind)
+	if cube is None:
+		cube = mapinterp.interpolateMaps(getattr(data, kind), mapinterp.mapHours(data), data.dlon)
+		with _lock:
+			data.maps[kind] = cube
+			_evict()
+	return cube
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Vectorized TEC and RMS TEC values at arrays of
+# (time, latitude, longitude) from an IONEX file.
+# @version 1.0
+#
+# The grid cell around every point is found directly
+# from LAT1/DLAT and LON1/DLON, and the 4-point formula
+# of the IONEX manual is applied to all the points at
+# once,
+#
+#   E(lat,lon) = (1-p)(1-q) E00 + p(1-q) E01 + q(1-p) E10 + pq E11
+#
+# Points exactly on a grid node (or on the last row or
+# column of the grid) are handled, and longitudes wrap
+# around the date line for global grids. Points beyond
+# the first/last latitude row use the value of that row.
+#
+# In time the maps are interpolated as in mapinterp,
+# i.e. the two maps around every time are rotated by
+# the Earth's rotation and linearly interpolated, but
+# only at the points requested.
+#
+# Input:
+#	filename	IONEX file name (or IONEXData)
+#	times		hours since 00:00 UT of the day
+#			of the first map, or datetime64
+#	lat		latitudes (degrees)
+#	lon		longitudes (degrees)
+# Output:
+#	tec, rms	TEC and RMS TEC values (same
+#			units as in the IONEX file)
+#------------------------------------------------------
+
+import numpy
+
+import ionexcache
+import mapinterp
+
+def gridIndex(dlat, dlon, pointsLat, pointsLon, lat, lon):
+	"""Lower grid indices (row, column), the next column, and
+	the fractions (q, p) of every point within its cell."""
+	startLat, endLat, stepLat = dlat
+	startLon, endLon, stepLon = dlon
+
+	y = (numpy.asarray(lat, dtype=float) - startLat)/stepLat
+	x = (numpy.asarray(lon, dtype=float) - startLon)/stepLon
+
+	row = numpy.clip(numpy.floor(y), 0, pointsLat-2).astype(int)
+	q = numpy.clip(y - row, 0.0, 1.0)
+
+	if abs(abs(endLon - startLon) - 360.0) < 1e-6:
+		# the last column repeats the first one (-180 == 180)
+		x = numpy.mod(x, pointsLon-1)
+	col = numpy.clip(numpy.floor(x), 0, pointsLon-2).astype(int)
+	p = numpy.clip(x - col, 0.0, 1.0)
+
+	return row, col, q, p
+
+def bilinear(maps, dlat, dlon, lat, lon, index=None):
+	"""4-point interpolation in the maps[...,lat,lon]. Without
+	'index' every map is evaluated at every point; otherwise
+	point n is taken from maps[index[n]]."""
+	pointsLat, pointsLon = maps.shape[-2:]
+	row, col, q, p = gridIndex(dlat, dlon, pointsLat, pointsLon, lat, lon)
+	if index is None:
+		v = lambda r, c: maps[..., r, c]
+	else:
+		v = lambda r, c: maps[index, r, c]
+	return ((1.0-p)*(1.0-q)*v(row, col) + p*(1.0-q)*v(row, col+1) +
+		q*(1.0-p)*v(row+1, col) + p*q*v(row+1, col+1))
+
+def _timeInterpolated(a, hours, dlon, dlat, t, lat, lon):
+	rotate = mapinterp.ROTATION
+	if len(hours) == 1:
+		index = numpy.zeros(t.shape, dtype=int)
+		return bilinear(a, dlat, dlon, lat, lon + rotate*(t - hours[0]), index)
+
+	i = numpy.clip(numpy.searchsorted(hours, t, side='right') - 1, 0, len(hours)-2)
+	w = numpy.clip((t - hours[i])/(hours[i+1] - hours[i]), 0.0, 1.0)
+
+	before = bilinear(a, dlat, dlon, lat, lon + rotate*(t - hours[i]), i)
+	after = bilinear(a, dlat, dlon, lat, lon + rotate*(t - hours[i+1]), i+1)
+	return (1.0-w)*before + w*after
+
+def lookupTEC(filename, times, lat, lon):
+
+	data = ionexcache.getIONEX(filename)
+
+	times = numpy.asarray(times)
+	if times.dtype.kind == 'M':
+		times = mapinterp.epochHours(data, times)
+	t, lat, lon = numpy.broadcast_arrays(numpy.asarray(times, dtype=float),
+		numpy.asarray(lat, dtype=float), numpy.asarray(lon, dtype=float))
+
+	hours = mapinterp.mapHours(data)
+	tec = _timeInterpolated(data.tec, hours, data.dlon, data.dlat, t, lat, lon)
+	rms = None
+	if data.rms is not None:
+		rms = _timeInterpolated(data.rms, hours, data.dlon, data.dlat, t, lat, lon)
+
+	return tec, rms
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Read an IONEX file once and keep everything ionFR
+# needs from it in memory.
+# @version 1.0
+#
+# The file is walked a single time. Header records
+# (DHGT, DLAT, DLON, EXPONENT, INTERVAL, ...) are
+# decoded as they are met, and the data records of
+# every TEC and RMS map are collected untouched. The
+# fixed-width (I5) values of all maps are then decoded
+# in one go with NumPy, instead of splitting each line
+# into Python tokens.
+#
+# The values are kept exactly as they are written in
+# the file (as integers), i.e. they still have to be
+# multiplied by 10**exponent to obtain TEC units.
+#
+# Input:
+#	filename	IONEX file name
+# Output:
+#	IONEXData instance holding
+#	tec		TEC maps, array[map,lat,lon]
+#	rms		RMS TEC maps, array[map,lat,lon]
+#			(None if the file has no RMS maps)
+#	epochs		epoch of every map (datetime64[s])
+#	dhgt		(HGT1, HGT2, DHGT) in km
+#	dlat		(LAT1, LAT2, DLAT) in degrees
+#	dlon		(LON1, LON2, DLON) in degrees
+#	exponent	EXPONENT of the TEC values
+#	interval	INTERVAL between maps (seconds)
+#------------------------------------------------------
+
+import numpy
+
+# Width of a single value and number of values per data record
+FIELDWIDTH = 5
+FIELDSPERLINE = 16
+
+class IONEXData(object):
+	"""Parsed contents of one IONEX file."""
+
+	def __init__(self, tec, rms, epochs, dhgt, dlat, dlon, exponent, interval, filename=None):
+		self.tec = tec
+		self.rms = rms
+		self.epochs = epochs
+		self.dhgt = dhgt
+		self.dlat = dlat
+		self.dlon = dlon
+		self.exponent = exponent
+		self.interval = interval
+		self.filename = filename
+		# time-interpolated maps, filled in by ionexcache
+		self.maps = {}
+
+	def latitudes(self):
+		"""Latitudes (degrees) of the grid nodes."""
+		return self.dlat[0] + self.dlat[2]*numpy.arange(self.tec.shape[1])
+
+	def longitudes(self):
+		"""Longitudes (degrees) of the grid nodes."""
+		return self.dlon[0] + self.dlon[2]*numpy.arange(self.tec.shape[2])
+
+	def ionHeight(self):
+		"""Height of the Ionospheric thin shell (km)."""
+		return self.dhgt[0]
+
+def _decodeMaps(records, numberOfMaps, pointsLat, pointsLon):
+	# Every latitude row of a map takes the same number of data
+	# records. Padding each record to its full width lets us decode
+	# all the values at once as fixed-width fields.
+	if numberOfMaps == 0:
+		return None
+	linesPerRow = -(-pointsLon // FIELDSPERLINE)
+	if len(records) != numberOfMaps*pointsLat*linesPerRow:
+		raise ValueError('IONEX map data does not match the grid given in the header')
+	width = FIELDWIDTH*FIELDSPERLINE
+	buf = ''.join([rec.ljust(width)[:width] for rec in records]).encode('ascii')
+	fields = numpy.frombuffer(buf, dtype='S%d' % FIELDWIDTH)
+	fields = fields.reshape(numberOfMaps, pointsLat, linesPerRow*FIELDSPERLINE)[:, :, :pointsLon]
+	return fields.astype(numpy.int32)
+
+def readIONEX(filename):
+
+	header = {}
+	epochs = []
+	records = {'TEC': [], 'RMS': []}
+	counts = {'TEC': 0, 'RMS': 0}
+	exponent = -1 # default value given in the IONEX manual
+	inHeader = True
+	current = None
+
+	f = open(filename, 'r')
+	try:
+		for line in f:
+			line = line.rstrip('\r\n')
+			label = line[60:].strip()
+			if inHeader:
+				if label == 'END OF HEADER':
+					inHeader = False
+				elif label in ('HGT1 / HGT2 / DHGT', 'LAT1 / LAT2 / DLAT', 'LON1 / LON2 / DLON'):
+					header[label] = tuple([float(x) for x in line[:60].split()[:3]])
+				elif label == 'EXPONENT':
+					exponent = int(line[:60].split()[0])
+				elif label == 'INTERVAL':
+					header[label] = float(line[:60].split()[0])
+				continue
+			if label.startswith('START OF') and label.endswith('MAP'):
+				current = label.split()[2]
+				if current in counts:
+					counts[current] += 1
+			elif label.startswith('END OF') and label.endswith('MAP'):
+				current = None
+			elif label == 'EPOCH OF CURRENT MAP':
+				if current == 'TEC':
+					epochs.append('%04d-%02d-%02dT%02d:%02d:%02d' % tuple([int(x) for x in line[:36].split()]))
+			elif current in records and label != 'LAT/LON1/LON2/DLON/H' and label != 'EXPONENT':
+				records[current].append(line)
+	finally:
+		f.close()
+
+	dhgt = header['HGT1 / HGT2 / DHGT']
+	dlat = header['LAT1 / LAT2 / DLAT']
+	dlon = header['LON1 / LON2 / DLON']
+
+	# Variables that indicate the number of points in Lat. and Lon.
+	pointsLat = int(round((dlat[1] - dlat[0])/dlat[2])) + 1
+	pointsLon = int(round((dlon[1] - dlon[0])/dlon[2])) + 1
+
+	tec = _decodeMaps(records['TEC'], counts['TEC'], pointsLat, pointsLon)
+	rms = _decodeMaps(records['RMS'], counts['RMS'], pointsLat, pointsLon)
+	epochs = numpy.array(epochs, dtype='datetime64[s]')
+	interval = header.get('INTERVAL', 0.0)
+
+	return IONEXData(tec, rms, epochs, dhgt, dlat, dlon, exponent, interval, filename)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# TEC and RMS TEC from consecutive daily IONEX files,
+# on one continuous time axis.
+# @version 1.0
+#
+# An IONEXSeries starts from one IONEX file and finds
+# the files of the other days next to it (same
+# directory, same naming, see dayFile), so epochs
+# before 00:00 UT or after 24:00 UT of that day can be
+# looked up too. Files are only opened when an epoch
+# needs them, through ionexcache, and the series only
+# holds the last 'window' days it has used.
+#
+# For the epochs of a day, the maps of that day's file
+# are stitched with those of the previous (next) day's
+# file when an epoch falls before its first map (after
+# its last map before 24:00). A map epoch present in
+# both files (e.g. 24:00 of one day and 00:00 of the
+# next) is then taken from the file of the day it
+# belongs to, so the TEC is continuous across the file
+# boundaries. The stitched maps are interpolated
+# exactly as in ionexlookup.
+# When the adjacent file is not there the first (last)
+# map is rotated to the epoch, as for a single file.
+#
+# A series used for a long stream of epochs (see
+# ionrm.stream) is told to forget() the days it has gone
+# past, which also drops them from ionexcache.
+#
+# The values of every day are scaled to the EXPONENT of
+# the first file, and the grids of all the files must
+# be the same.
+#
+# Input:
+#	filename	IONEX file of one day
+#	times		datetime64 epochs (or hours since
+#			00:00 UT of the day of that file)
+#	lat		latitudes (degrees)
+#	lon		longitudes (degrees)
+# Output:
+#	tec, rms	TEC and RMS TEC values (in units of
+#			10**exponent TECU of the first file;
+#			rms is NaN where a day has no RMS
+#			maps, and None if the first file
+#			has none)
+#
+# Usage:
+#	series = ionexseries.IONEXSeries('codg2930.11i')
+#	tec, rms = series.lookupTEC(times, lat, lon)
+#------------------------------------------------------
+
+import os
+import re
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy
+
+import ionexcache
+import ionexlookup
+
+# Number of days held by a series
+window = 3
+
+# cccgDDDh.YYi (e.g. codg2930.11i) and the long names of
+# the IGS, e.g. IGS0OPSFIN_20232930000_01D_02H_GIM.INX
+SHORTNAME = re.compile(r'^(.{4})(\d{3})(\d\.)(\d{2})([iI].*)$')
+LONGNAME = re.compile(r'^(.*_)(\d{4})(\d{3})(\d{4}_01D_.*)$')
+
+def dayFile(filename, days):
+	"""Name of the IONEX file 'days' days after the one of
+	'filename', or None if the name does not follow one of
+	the usual patterns."""
+	folder, name = os.path.split(filename)
+	match = SHORTNAME.match(name)
+	if match is not None:
+		prefix, doy, hour, yy, suffix = match.groups()
+		year = int(yy) + 2000
+		if year > 2079:
+			year = year - 100
+		date = datetime.date(year, 1, 1) + datetime.timedelta(int(doy) - 1 + days)
+		name = '%s%03d%s%02d%s' % (prefix, date.timetuple().tm_yday, hour, date.year % 100, suffix)
+		return os.path.join(folder, name)
+	match = LONGNAME.match(name)
+	if match is not None:
+		prefix, year, doy, suffix = match.groups()
+		date = datetime.date(int(year), 1, 1) + datetime.timedelta(int(doy) - 1 + days)
+		name = '%s%04d%03d%s' % (prefix, date.year, date.timetuple().tm_yday, suffix)
+		return os.path.join(folder, name)
+	return None
+
+class IONEXSeries(object):
+	"""Consecutive daily IONEX files around 'filename'. 'locate'
+	can be given to find them instead of dayFile: it is called
+	with a datetime64[D] and returns a file name or None."""
+
+	def __init__(self, filename, locate=None, window=None):
+		first = ionexcache.getIONEX(filename)
+		self.filename = first.filename or filename
+		self.locate = locate
+		if window is None:
+			window = globals()['window']
+		self.window = max(3, int(window))
+		self.day = first.epochs[0].astype('datetime64[D]')
+		self.dhgt = first.dhgt
+		self.dlat = first.dlat
+		self.dlon = first.dlon
+		self.exponent = first.exponent
+		self.hasRMS = first.rms is not None
+		self._days = OrderedDict()
+		self._days[self.day] = first
+		self._missing = set()
+		self._lock = threading.RLock()
+
+	def ionHeight(self):
+		"""Height of the Ionospheric thin shell (km)."""
+		return self.dhgt[0]
+
+	def _path(self, day):
+		if self.locate is not None:
+			return self.locate(day)
+		offset = int((day - self.day)/numpy.timedelta64(1, 'D'))
+		return dayFile(self.filename, offset)
+
+	def getDay(self, day):
+		"""IONEXData of a day (datetime64[D]), or None if there is
+		no file for it."""
+		day = numpy.datetime64(day, 'D')
+		with self._lock:
+			data = self._days.get(day)
+			if data is not None:
+				self._days.move_to_end(day)
+				return data
+			if day in self._missing:
+				return None
+		name = self._path(day)
+		if name is None or not os.path.exists(name):
+			with self._lock:
+				self._missing.add(day)
+			return None
+		data = ionexcache.getIONEX(name)
+		if data.dlat != self.dlat or data.dlon != self.dlon:
+			raise ValueError('the grid of %s is not the one of %s' % (name, self.filename))
+		with self._lock:
+			self._days[day] = data
+			self._days.move_to_end(day)
+			while len(self._days) > self.window:
+				self._days.popitem(last=False)
+		return data
+
+	def days(self):
+		"""Days held at the moment."""
+		with self._lock:
+			return sorted(self._days.keys())
+
+	def forget(self, day):
+		"""Drop the days before 'day' (from the series and from
+		ionexcache), e.g. once a stream of epochs has gone past
+		them, and look again for the files found missing."""
+		day = numpy.datetime64(day, 'D')
+		with self._lock:
+			old = [(d, data) for d, data in self._days.items() if d < day]
+			for d, data in old:
+				del self._days[d]
+			self._missing.clear()
+		for d, data in old:
+			try:
+				ionexcache.discard(ionexcache.fileKey(data.filename or self._path(d)), data)
+			except (TypeError, OSError):
+				pass
+
+	def _scaled(self, data, kind):
+		a = getattr(data, kind)
+		if a is None:
+			return None
+		if data.exponent != self.exponent:
+			a = a*pow(10.0, data.exponent - self.exponent)
+		return a
+
+	def _stitch(self, day, data, before, after):
+		# maps of 'day', with those of the previous (next) day before
+		# (after) them; every epoch is taken from the file of its day
+		start = numpy.datetime64(day, 's')
+		end = start + numpy.timedelta64(1, 'D')
+		keep = numpy.ones(len(data.epochs), dtype=bool)
+		parts = []
+		if before is not None:
+			keep &= data.epochs >= start
+			parts.append((before, before.epochs < start))
+		if after is not None:
+			keep &= data.epochs < end
+		parts.append((data, keep))
+		if after is not None:
+			parts.append((after, after.epochs >= end))
+		hours = []
+		tec = []
+		rms = []
+		for d, rows in parts:
+			hours.append((d.epochs[rows] - day)/numpy.timedelta64(1, 's')/3600.0)
+			tec.append(self._scaled(d, 'tec')[rows])
+			r = self._scaled(d, 'rms')
+			if r is None:
+				r = numpy.full(tec[-1].shape, numpy.nan)
+			rms.append(r[rows])
+		if len(parts) == 1 and parts[0][1].all():
+			return hours[0], tec[0], rms[0]
+		return numpy.concatenate(hours), numpy.concatenate(tec), numpy.concatenate(rms)
+
+	def lookupTEC(self, times, lat, lon):
+
+		times = numpy.asarray(times)
+		if times.dtype.kind != 'M':
+			times = self.day + (numpy.asarray(times, dtype=float)*3.6e6).astype('timedelta64[ms]')
+		times, lat, lon = numpy.broadcast_arrays(times.astype('datetime64[ms]'),
+			numpy.asarray(lat, dtype=float), numpy.asarray(lon, dtype=float))
+
+		tec = numpy.empty(times.shape)
+		rms = numpy.empty(times.shape)
+		days, dayIndex = numpy.unique(times.astype('datetime64[D]'), return_inverse=True)
+		dayIndex = dayIndex.reshape(times.shape)
+		for k, day in enumerate(days):
+			points = dayIndex == k
+			t = (times[points] - day)/numpy.timedelta64(1, 's')/3600.0
+			data = self.getDay(day)
+			if data is None:
+				# no file for this day: the nearest day with one is used
+				# (its first or last map rotated to the epoch)
+				data = self.getDay(day - numpy.timedelta64(1, 'D'))
+				if data is None:
+					data = self.getDay(day + numpy.timedelta64(1, 'D'))
+				if data is None:
+					raise ValueError('no IONEX file for %s or the days next to it' % day)
+				before = after = None
+			else:
+				# the maps of this day proper, from 00:00 to before 24:00
+				hours = (data.epochs - day)/numpy.timedelta64(1, 's')/3600.0
+				own = hours[(hours >= 0.0) & (hours < 24.0)]
+				if len(own) == 0:
+					own = hours
+				before = after = None
+				if t.min() < own[0]:
+					before = self.getDay(day - numpy.timedelta64(1, 'D'))
+				if t.max() > own[-1]:
+					after = self.getDay(day + numpy.timedelta64(1, 'D'))
+			hours, tecMaps, rmsMaps = self._stitch(day, data, before, after)
+			tec[points] = ionexlookup._timeInterpolated(tecMaps, hours, self.dlon, self.dlat, t, lat[points], lon[points])
+			rms[points] = ionexlookup._timeInterpolated(rmsMaps, hours, self.dlon, self.dlat, t, lat[points], lon[points])
+
+		if not self.hasRMS:
+			rms = None
+		return tec, rms
+
+def lookupTEC(source, times, lat, lon):
+	"""ionexlookup.lookupTEC for an IONEX file, an IONEXData or an
+	IONEXSeries."""
+	if isinstance(source, IONEXSeries):
+		return source.lookupTEC(times, lat, lon)
+	return ionexlookup.lookupTEC(source, times, lat, lon)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Parsed IONEX files shared between processes.
+# @version 1.0
+#
+# publish() copies the maps of a parsed IONEX file (and
+# any time-interpolated maps already computed for it,
+# see ionexcache.interpolatedMaps) into one block of
+# multiprocessing.shared_memory, once, in the parent
+# process. The SharedHandle it returns is small and can
+# be sent to worker processes, where attach() maps the
+# block and puts an IONEXData with read-only NumPy views
+# of it in ionexcache, so ionexcache.getIONEX() of that
+# file returns it without reading, parsing or copying
+# anything. detach() drops the worker's views again.
+#
+# The parent counts the jobs that use every block:
+# publish() adds 'uses' to the count of the file and
+# release() takes them away; the block is unlinked when
+# the count reaches 0 (the memory itself is returned
+# once the workers have dropped their views too). The
+# parent does not keep its parsed copy of a file once it
+# is published, so every file is held only once.
+# releaseAll() unlinks every block, e.g. when a run is
+# interrupted.
+#
+# Usage:
+#	parent:	ionexshared.prepareWorkers()	(before the pool)
+#		handle = ionexshared.publish(filename, uses=n)
+#		... send handle with every job ...
+#		ionexshared.release(handle)	(after every job)
+#	worker:	ionexshared.attach(handle)
+#		data = ionexcache.getIONEX(filename)
+#		ionexshared.detach(handle)
+#------------------------------------------------------
+
+import sys
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy
+
+import ionexcache
+import ionexread
+
+# Offsets of the arrays in a block are multiples of ALIGN bytes
+ALIGN = 64
+
+class SharedHandle(object):
+	"""What a worker needs to map a published IONEX file: the
+	name of the block, the layout of its arrays and the header
+	values of the file."""
+
+	def __init__(self, name, key, arrays, epochs, dhgt, dlat, dlon, exponent, interval, filename):
+		self.name = name
+		self.key = key
+		# (what, dtype, shape, offset) for every array of the block
+		self.arrays = arrays
+		self.epochs = epochs
+		self.dhgt = dhgt
+		self.dlat = dlat
+		self.dlon = dlon
+		self.exponent = exponent
+		self.interval = interval
+		self.filename = filename
+
+# parent: key -> [SharedMemory, handle, uses]
+_published = {}
+# worker: key -> (SharedMemory, IONEXData)
+_attached = {}
+_lock = threading.RLock()
+
+def _open(name, create=False, size=0):
+	if sys.version_info >= (3, 13):
+		# the block is owned by the parent, not by every process
+		# that maps it
+		return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+	return shared_memory.SharedMemory(name=name, create=create, size=size)
+
+def prepareWorkers():
+	"""Call before starting the worker processes. Before Python
+	3.13 every process that maps a block registers it with its
+	resource tracker, which unlinks it when the process exits;
+	workers started afterwards share the parent's tracker."""
+	if sys.version_info < (3, 13):
+		resource_tracker.ensure_running()
+
+def publish(filename, uses=1):
+	"""Put a parsed IONEX file in shared memory (once) and count
+	'uses' more jobs for it. Return its SharedHandle."""
+	data = ionexcache.getIONEX(filename)
+	key = ionexcache.fileKey(data.filename or filename)
+	with _lock:
+		entry = _published.get(key)
+		if entry is not None:
+			entry[2] += uses
+			return entry[1]
+
+		arrays = [('tec', data.tec)]
+		if data.rms is not None:
+			arrays.append(('rms', data.rms))
+		for kind, cube in sorted(data.maps.items()):
+			arrays.append(('maps.' + kind, cube))
+		layout = []
+		size = 0
+		for what, a in arrays:
+			layout.append((what, a.dtype.str, a.shape, size))
+			size += -(-a.nbytes // ALIGN)*ALIGN
+
+		block = _open(None, create=True, size=max(size, 1))
+		try:
+			for (what, a), (_, dtype, shape, offset) in zip(arrays, layout):
+				view = numpy.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+				view[...] = a
+				del view
+		except BaseException:
+			block.close()
+			block.unlink()
+			raise
+		# the parent keeps only the block, not its own copy too
+		ionexcache.discard(key, data)
+		handle = SharedHandle(block.name, key, layout, data.epochs, data.dhgt, data.dlat, data.dlon,
+			data.exponent, data.interval, data.filename or filename)
+		_published[key] = [block, handle, uses]
+		return handle
+
+def release(handle, uses=1):
+	"""Count 'uses' jobs of a published file as finished; unlink
+	its block when none is left."""
+	with _lock:
+		entry = _published.get(handle.key)
+		if entry is None:
+			return
+		entry[2] -= uses
+		if entry[2] <= 0:
+			del _published[handle.key]
+			entry[0].close()
+			entry[0].unlink()
+
+def releaseAll():
+	"""Unlink every block published by this process."""
+	with _lock:
+		for entry in _published.values():
+			entry[0].close()
+			entry[0].unlink()
+		_published.clear()
+
+def published():
+	"""Number of blocks published by this process."""
+	with _lock:
+		return len(_published)
+
+def attach(handle):
+	"""Map a published file and put it in ionexcache. Return the
+	IONEXData (its arrays are read-only views of the block)."""
+	with _lock:
+		entry = _attached.get(handle.key)
+		if entry is not None:
+			return entry[1]
+		block = _open(handle.name)
+		views = {}
+		for what, dtype, shape, offset in handle.arrays:
+			view = numpy.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+			view.flags.writeable = False
+			views[what] = view
+		data = ionexread.IONEXData(views['tec'], views.get('rms'), handle.epochs, handle.dhgt,
+			handle.dlat, handle.dlon, handle.exponent, handle.interval, handle.filename)
+		for what, view in views.items():
+			if what.startswith('maps.'):
+				data.maps[what[5:]] = view
+		_attached[handle.key] = (block, data)
+		ionexcache.insert(handle.key, data)
+		return data
+
+def detach(handle):
+	"""Drop this process' views of a published file."""
+	with _lock:
+		entry = _attached.pop(handle.key, None)
+		if entry is None:
+			return
+		ionexcache.discard(handle.key, entry[1])
+		block = entry[0]
+		del entry
+		try:
+			block.close()
+		except BufferError:
+			# views still held by the caller keep the mapping
+			# alive until they are gone
+			pass
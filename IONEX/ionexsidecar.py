@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Binary sidecar files for IONEX files.
+# @version 1.0
+#
+# The first time an IONEX file is parsed, its TEC and
+# RMS maps are written next to it (or into 'sidecarDir'
+# when that is set) as '<IONEX file>.ionfr'. Later runs
+# map that file into memory with numpy.memmap instead of
+# parsing the text again, so the maps are used without
+# being copied.
+#
+# The sidecar remembers the size and modification time
+# of the IONEX file it was made from; when they do not
+# match any more the IONEX file is parsed again and the
+# sidecar rewritten. Failing to write a sidecar (e.g. a
+# read-only archive) is not an error, the parsed maps
+# are simply returned.
+#
+# Layout of a sidecar:
+#	MAGIC			8 bytes
+#	header length		8 bytes, little endian
+#	header			JSON, padded to ALIGN bytes
+#	TEC maps		int32 [map,lat,lon]
+#	RMS maps		int32 [map,lat,lon] (if any)
+#------------------------------------------------------
+
+import os
+import json
+import struct
+import tempfile
+
+import numpy
+import ionexread
+
+# umask of the process, read once (setting it is not thread safe)
+_umask = os.umask(0)
+os.umask(_umask)
+
+MAGIC = b'IONFRX1\n'
+ALIGN = 64
+SIDECAR_SUFFIX = '.ionfr'
+
+# Set to False to always parse the IONEX text, or set
+# 'sidecarDir' to keep the sidecars away from the IONEX files
+enabled = True
+sidecarDir = None
+
+def sidecarName(filename):
+	if sidecarDir is None:
+		return filename + SIDECAR_SUFFIX
+	return os.path.join(sidecarDir, os.path.basename(filename) + SIDECAR_SUFFIX)
+
+def _source(filename):
+	st = os.stat(filename)
+	return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def writeSidecar(data, filename):
+	"""Write the maps of 'data' (parsed from 'filename') to its sidecar."""
+	cubes = [data.tec]
+	if data.rms is not None:
+		cubes.append(data.rms)
+	header = {
+		'source': _source(filename),
+		'dhgt': data.dhgt,
+		'dlat': data.dlat,
+		'dlon': data.dlon,
+		'exponent': data.exponent,
+		'interval': data.interval,
+		'epochs': [str(e) for e in data.epochs],
+		'shape': list(data.tec.shape),
+		'rms': data.rms is not None,
+	}
+	blob = json.dumps(header).encode('ascii')
+	start = len(MAGIC) + 8 + len(blob)
+	blob += b' '*(-start % ALIGN)
+
+	name = sidecarName(filename)
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(name)),
+		prefix='.' + os.path.basename(name) + '.', suffix='.tmp')
+	try:
+		f = os.fdopen(fd, 'wb')
+		try:
+			f.write(MAGIC)
+			f.write(struct.pack('<Q', len(blob)))
+			f.write(blob)
+			for cube in cubes:
+				f.write(numpy.ascontiguousarray(cube, dtype='<i4').tobytes())
+		finally:
+			f.close()
+		# readable by whoever can read the IONEX file (mkstemp
+		# makes it private)
+		os.chmod(tmp, 0o666 & ~_umask)
+		os.replace(tmp, name)
+	except BaseException:
+		os.unlink(tmp)
+		raise
+
+def readSidecar(filename):
+	"""IONEXData memory-mapped from the sidecar of 'filename'.
+
+	None is returned if there is no sidecar, or if it is
+	out of date.
+	"""
+	name = sidecarName(filename)
+	try:
+		f = open(name, 'rb')
+	except (IOError, OSError):
+		return None
+	try:
+		try:
+			if f.read(len(MAGIC)) != MAGIC:
+				return None
+			length = struct.unpack('<Q', f.read(8))[0]
+			header = json.loads(f.read(length).decode('ascii'))
+		finally:
+			f.close()
+		if header['source'] != _source(filename):
+			return None
+
+		shape = tuple(header['shape'])
+		offset = len(MAGIC) + 8 + length
+		tec = numpy.memmap(name, dtype='<i4', mode='r', offset=offset, shape=shape)
+		rms = None
+		if header['rms']:
+			offset += tec.nbytes
+			rms = numpy.memmap(name, dtype='<i4', mode='r', offset=offset, shape=shape)
+	except (ValueError, KeyError, struct.error):
+		# truncated or damaged sidecar, it will be written again
+		return None
+	epochs = numpy.array(header['epochs'], dtype='datetime64[s]')
+	return ionexread.IONEXData(tec, rms, epochs, tuple(header['dhgt']), tuple(header['dlat']),
+		tuple(header['dlon']), header['exponent'], header['interval'], filename)
+
+def loadIONEX(filename):
+	"""Parsed IONEX file, taken from its sidecar whenever possible."""
+	if not enabled:
+		return ionexread.readIONEX(filename)
+	data = readSidecar(filename)
+	if data is None:
+		data = ionexread.readIONEX(filename)
+		if data.tec is None:
+			# a file without TEC maps: nothing to keep
+			return data
+		try:
+			writeSidecar(data, filename)
+		except (IOError, OSError):
+			pass
+	return data
@@ -6,24 +6,22 @@
 #------------------------------------------
 
 import numpy
+import ionexcache
 
-def calcionheight(filename): 
+def calcionheight(filename):
 
-	# opening and reading the IONEX file into memory
-	linestring = open(filename, 'r').read()
-	LongList = linestring.split('\n')
-	################################################
+	# the IONEX file is parsed only if it is not
+	# already held by ionexcache
+	data = ionexcache.getIONEX(filename)
 
-	for i in range(len(LongList)-1):
-		if LongList[i].split()[-1] == 'DHGT':
-			IonH = float(LongList[i].split()[0])
+	IonH = data.ionHeight()
 
 	return IonH
 
 
 
-		
-		
+
+
 
 
 
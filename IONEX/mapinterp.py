@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------
+# Interpolation in time of the maps of an IONEX file.
+# @version 2.0
+#
+# The interpolation method used is the third one
+# indicated in the IONEX manual: the two maps around
+# the requested time are rotated in longitude by the
+# Earth's rotation (15 degrees per hour) since their
+# own epoch, and then linearly interpolated in time,
+#
+#   E(t,lat,lon) = (T[i+1]-t)/(T[i+1]-T[i]) * E[i](lat, lon+15*(t-T[i]))
+#                + (t-T[i])/(T[i+1]-T[i])   * E[i+1](lat, lon+15*(t-T[i+1]))
+#
+# Time is a continuous parameter (hours since 00:00 UT
+# of the day of the first map), so any number of maps
+# and any map interval can be used, and the maps can be
+# evaluated at any time. Rotations that are not a whole
+# number of grid columns are linearly interpolated in
+# longitude. Global grids wrap around the date line;
+# for regional grids the edge columns are repeated.
+# Times before the first (after the last) map use the
+# first (last) map rotated to that time.
+#
+# Input:
+#	a		array[map,lat,lon] with the
+#			maps read from the IONEX file
+#	hours		time of every map (hours)
+#	dlon		(LON1, LON2, DLON) of the grid
+#	t		times at which the maps are
+#			wanted (hours)
+# Output:
+#	array[time,lat,lon] with the interpolated maps
+#------------------------------------------------------
+
+import numpy
+
+# Rotation of the Earth in degrees per hour
+ROTATION = 15.0
+
+def mapHours(data):
+	"""Epoch of every map of an IONEXData, in hours since
+	00:00 UT of the day of the first map."""
+	return epochHours(data, data.epochs)
+
+def epochHours(data, epochs):
+	"""Times (datetime64) in hours since 00:00 UT of the day
+	of the first map of an IONEXData."""
+	day = data.epochs[0].astype('datetime64[D]')
+	seconds = (numpy.asarray(epochs, dtype='datetime64[ms]') - day)/numpy.timedelta64(1, 's')
+	return seconds/3600.0
+
+def _rotate(maps, shift, dlon):
+	# maps[k] evaluated at lon + shift[k] (degrees), i.e. columns
+	# are taken shift[k]/DLON places to the east
+	pointsLon = maps.shape[-1]
+	startLon, endLon, stepLon = dlon
+	columns = numpy.asarray(shift, dtype=float)/stepLon
+	whole = numpy.floor(columns)
+	frac = (columns - whole)[:, None, None]
+	index = numpy.arange(pointsLon)[None, :] + whole.astype(int)[:, None]
+
+	periodic = abs(abs(endLon - startLon) - 360.0) < 1e-6
+	if periodic:
+		# the last column repeats the first one (-180 == 180)
+		unique = pointsLon - 1
+		lower = index % unique
+		upper = (index + 1) % unique
+	else:
+		lower = numpy.clip(index, 0, pointsLon-1)
+		upper = numpy.clip(index + 1, 0, pointsLon-1)
+
+	lower = numpy.broadcast_to(lower[:, None, :], maps.shape)
+	upper = numpy.broadcast_to(upper[:, None, :], maps.shape)
+	return (1.0-frac)*numpy.take_along_axis(maps, lower, axis=2) + frac*numpy.take_along_axis(maps, upper, axis=2)
+
+def interpolateAt(a, hours, dlon, t):
+
+	hours = numpy.asarray(hours, dtype=float)
+	t = numpy.atleast_1d(numpy.asarray(t, dtype=float))
+
+	if len(hours) == 1:
+		return _rotate(a[numpy.zeros(len(t), dtype=int)], ROTATION*(t - hours[0]), dlon)
+
+	# maps i and i+1 are the ones around every requested time
+	i = numpy.clip(numpy.searchsorted(hours, t, side='right') - 1, 0, len(hours)-2)
+	w = numpy.clip((t - hours[i])/(hours[i+1] - hours[i]), 0.0, 1.0)[:, None, None]
+
+	before = _rotate(a[i], ROTATION*(t - hours[i]), dlon)
+	after = _rotate(a[i+1], ROTATION*(t - hours[i+1]), dlon)
+	return (1.0-w)*before + w*after
+
+def interpolateMaps(a, hours, dlon, step=1.0):
+	"""Maps every 'step' hours from the first to the last map
+	(for a day of two-hourly maps, the 25 maps 00~24 h)."""
+	hours = numpy.asarray(hours, dtype=float)
+	total = int(numpy.floor((hours[-1] - hours[0])/step + 1e-9)) + 1
+	return interpolateAt(a, hours, dlon, hours[0] + step*numpy.arange(total))
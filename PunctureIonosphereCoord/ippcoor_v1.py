@@ -32,7 +32,9 @@
 #			from IPP
 #-------------------------------------------------------------------
 
-from scipy import *
+import math
+from math import pi
+import numpy
 
 def PuncIonOffset(LatObs,AzSou,ZeSou,AltIon):
 
@@ -67,3 +69,44 @@ def PuncIonOffset(LatObs,AzSou,ZeSou,AltIon):
 		AzPunc -= 2.*abs((abs(AzPunc)-pi/2.))
 
 	return dLat,dLon,AzPunc,ZenPunc
+
+
+#-------------------------------------------------------------------
+# Array version of PuncIonOffset: same inputs and outputs, given as
+# NumPy arrays (broadcast together), so that the IPP of a whole day
+# of samples or of a whole catalogue is found in a single call. The
+# azimuth quadrant corrections are applied through masks.
+#-------------------------------------------------------------------
+
+def PuncIonOffsetArray(LatObs,AzSou,ZeSou,AltIon):
+
+	RadiusEarth = 6371000.0 # in meters
+
+	LatObs, AzSou, ZeSou, AltIon = numpy.broadcast_arrays(numpy.asarray(LatObs, dtype=float),
+		numpy.asarray(AzSou, dtype=float), numpy.asarray(ZeSou, dtype=float), numpy.asarray(AltIon, dtype=float))
+
+	AzSou = numpy.where(AzSou > pi, AzSou - 2*pi, AzSou)
+
+	# The 2-D sine rule gives the zenith angle at the
+	# Ionospheric piercing point
+	ZenPunc = numpy.arcsin((RadiusEarth*numpy.sin(ZeSou))/(RadiusEarth + AltIon))
+
+	# Use the sum of the internal angles of a triange to determine theta
+	theta = ZeSou - ZenPunc
+
+	# The cosine rule for spherical triangles gives us the latitude
+	# at the IPP
+	lation = numpy.arcsin(numpy.sin(LatObs)*numpy.cos(theta) + numpy.cos(LatObs)*numpy.sin(theta)*numpy.cos(AzSou))
+	dLat = lation - LatObs # latitude difference
+
+	# Longitude difference using the 3-D sine rule (or for spherical triangles)
+	dLon = numpy.arcsin(numpy.sin(AzSou)*numpy.sin(theta)/numpy.cos(lation))
+
+	# Azimuth at the IPP using the 3-D sine rule
+	sazion = numpy.sin(AzSou)*numpy.cos(LatObs)/numpy.cos(lation)
+	AzPunc = numpy.arcsin(numpy.clip(sazion, -1.0, 1.0))
+
+	AzPunc = numpy.where(AzSou > 0.5*pi, AzPunc + 2.*numpy.abs(AzPunc-pi/2.), AzPunc)
+	AzPunc = numpy.where(AzSou < -0.5*pi, AzPunc - 2.*numpy.abs(numpy.abs(AzPunc)-pi/2.), AzPunc)
+
+	return dLat,dLon,AzPunc,ZenPunc
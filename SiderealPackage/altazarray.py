@@ -0,0 +1,183 @@
+"""altazarray.py: Vectorized equatorial to horizon coordinates.
+
+  The same formulas as sidereal.SiderealTime.fromDatetime,
+  sidereal.raToHourAngle and sidereal.coordRotate, applied
+  to NumPy arrays of UTC epochs (numpy.datetime64) so that
+  a whole series of times is converted in one call.
+  horizon() takes the lineofsight Source and Observer
+  objects (or their array variants) directly.
+"""
+#================================================================
+# Imports
+#----------------------------------------------------------------
+
+import numpy
+import sidereal
+#================================================================
+# Manifest constants
+#----------------------------------------------------------------
+
+TWO_PI  =  sidereal.TWO_PI
+# - - -   u t c E p o c h s
+
+def utcEpochs ( utc ):
+    """Convert timestamps to an array of UTC epochs.
+
+      [ utc is a datetime.datetime, a numpy.datetime64, or a
+        sequence or array of either ->
+          return those timestamps as a numpy.datetime64[us]
+          array (timezone-aware datetimes are converted to UTC) ]
+    """
+    #-- 1 --
+    if  isinstance ( utc, numpy.ndarray ) and utc.dtype.kind == 'M':
+        return utc.astype ( 'datetime64[us]' )
+
+    #-- 2 --
+    # [ naive datetimes are taken as UTC ]
+    values  =  numpy.atleast_1d ( numpy.asarray ( utc, dtype=object ) )
+    out  =  numpy.empty ( values.shape, dtype='datetime64[us]' )
+    for  k, dt  in  enumerate ( values.flat ):
+        offset  =  getattr ( dt, 'utcoffset', lambda: None ) ()
+        if  offset:
+            dt  =  dt - offset
+        if  getattr ( dt, 'tzinfo', None ) is not None:
+            dt  =  dt.replace ( tzinfo=None )
+        out.flat[k]  =  numpy.datetime64 ( dt, 'us' )
+    return out
+# - - -   g s t H o u r s
+
+def gstHours ( utc ):
+    """Greenwich sidereal time for an array of UTC epochs.
+
+      [ utc is an array of numpy.datetime64 ->
+          return the GST at each epoch in hours, in [0,24) ]
+    """
+    #-- 1 --
+    # [ days  :=  the dates of utc
+    #   years  :=  the years of utc ]
+    utc  =  utcEpochs ( utc )
+    days  =  utc.astype ( 'datetime64[D]' )
+    years  =  utc.astype ( 'datetime64[Y]' )
+
+    #-- 2 --
+    # [ nDays  :=  number of days between January 0.0 and utc ]
+    nDays  =  ( days - years.astype ( 'datetime64[D]' ) ).astype ( float ) + 1.0
+
+    #-- 3 --
+    # [ factorB  :=  sidereal.SiderealTime.factorB of every
+    #                year in utc, computed once per distinct year ]
+    yearNumbers  =  years.astype ( int ) + 1970
+    distinct, inverse  =  numpy.unique ( yearNumbers, return_inverse=True )
+    factorB  =  numpy.array ( [ sidereal.SiderealTime.factorB ( int(y) )
+                                for y in distinct ] )[inverse]
+    t0  =  nDays * sidereal.SIDEREAL_A - factorB.reshape ( nDays.shape )
+
+    #-- 4 --
+    # [ decUTC  :=  utc as decimal hours ]
+    decUTC  =  ( utc - days ) / numpy.timedelta64 ( 1, 'h' )
+
+    #-- 5 --
+    return  ( decUTC * sidereal.SiderealTime.SIDEREAL_C + t0 ) % 24.0
+# - - -   r a T o H o u r A n g l e
+
+def raToHourAngle ( ra, utc, eLong ):
+    """Convert right ascension to hour angle.
+
+      [ (ra is a right ascension in radians) and
+        (utc is an array of numpy.datetime64) and
+        (eLong is an east longitude in radians) ->
+          return the hour angle in radians, in [0,2*pi), at
+          those times and locations ]
+    """
+    #-- 1 --
+    # [ lst  :=  local sidereal time in radians ]
+    lst  =  sidereal.hoursToRadians ( ( gstHours ( utc ) +
+                                        sidereal.radiansToHours ( eLong ) ) % 24.0 )
+
+    #-- 2 --
+    return  ( lst - ra ) % TWO_PI
+# - - -   c o o r d R o t a t e
+
+def coordRotate ( x, y, z ):
+    """Vectorized sidereal.coordRotate.
+
+      [ x, y, and z are arrays of angles in radians ->
+          return (xt, yt) where
+          xt=arcsin(sin(x)*sin(y)+cos(x)*cos(y)*cos(z)) and
+          yt=arccos((sin(x)-sin(y)*sin(xt))/(cos(y)*cos(xt))) ]
+    """
+    #-- 1 --
+    xt  =  numpy.arcsin ( numpy.clip ( numpy.sin(x) * numpy.sin(y) +
+                                       numpy.cos(x) * numpy.cos(y) * numpy.cos(z),
+                                       -1.0, 1.0 ) )
+    #-- 2 --
+    # [ rounding can push the cosine just outside [-1,1] ]
+    yt  =  numpy.arccos ( numpy.clip ( ( numpy.sin(x) - numpy.sin(y) * numpy.sin(xt) ) /
+                                       ( numpy.cos(y) * numpy.cos(xt) ), -1.0, 1.0 ) )
+    #-- 3 --
+    yt  =  numpy.where ( numpy.sin(z) > 0.0, TWO_PI - yt, yt )
+
+    #-- 4 --
+    return (xt, yt)
+# - - -   a l t A z
+
+def altAz ( ra, dec, lat, lon, utc ):
+    """Horizon coordinates of a line of sight at many epochs.
+
+      [ (ra and dec are the equatorial coordinates of the source
+        in radians) and
+        (lat and lon are the observer's latitude and east
+        longitude in radians) and
+        (utc is an array of UTC epochs as numpy.datetime64) ->
+          return (az, alt, h, lat, lon) as float arrays in radians,
+          broadcast together, where az is in [0,2*pi), alt in
+          [-pi/2,pi/2], h is the hour angle in [0,2*pi), lat is
+          signed (north positive) and lon is the east longitude
+          in (-pi,pi] ]
+    """
+    #-- 1 --
+    utc  =  utcEpochs ( utc )
+    ra, dec, lat, lon, utc  =  numpy.broadcast_arrays (
+        numpy.asarray ( ra, dtype=float ) % TWO_PI,
+        numpy.asarray ( dec, dtype=float ),
+        numpy.asarray ( lat, dtype=float ),
+        numpy.asarray ( lon, dtype=float ), utc )
+
+    #-- 2 --
+    # [ h  :=  hour angle of the source at utc and lon ]
+    h  =  raToHourAngle ( ra, utc, lon )
+
+    #-- 3 --
+    # [ alt  :=  altitude of the source as seen from lat at utc
+    #   az  :=  azimuth of the source as seen from lat at utc ]
+    alt, az  =  coordRotate ( dec, lat, h )
+
+    #-- 4 --
+    lon  =  numpy.pi - ( numpy.pi - lon ) % TWO_PI
+    return (az, alt, h, lat.astype(float), lon)
+# - - -   h o r i z o n
+
+def horizon ( source, observer, utc ):
+    """Horizon coordinates of Source/SourceCatalog lines of sight.
+
+      [ (source is a lineofsight.Source or SourceCatalog) and
+        (observer is a lineofsight.Observer or ObserverArray) and
+        (utc is a UTC epoch or an array of them) ->
+          return altAz() for every observer, source and epoch,
+          as arrays of shape
+          observer.shape + source.shape + utc.shape ]
+    """
+    #-- 1 --
+    utc  =  utcEpochs ( utc )
+    nSrc  =  len ( source.shape )
+    nUtc  =  utc.ndim
+
+    #-- 2 --
+    # [ give every argument its own block of axes ]
+    lat  =  numpy.reshape ( observer.lat, observer.shape + (1,) * (nSrc + nUtc) )
+    lon  =  numpy.reshape ( observer.lon, observer.shape + (1,) * (nSrc + nUtc) )
+    ra  =  numpy.reshape ( source.ra, source.shape + (1,) * nUtc )
+    dec  =  numpy.reshape ( source.dec, source.shape + (1,) * nUtc )
+
+    #-- 3 --
+    return altAz ( ra, dec, lat, lon, utc )
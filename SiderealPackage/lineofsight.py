@@ -0,0 +1,360 @@
+"""lineofsight.py: Sources and observers, parsed once.
+
+  A Source holds the equatorial coordinates of a line of
+  sight and an Observer the position of a telescope, both
+  in radians, so that they can be used for any number of
+  epochs without parsing their sexagesimal strings again.
+  SourceCatalog and ObserverArray hold many of them as
+  NumPy arrays.
+
+  altazarray.horizon() takes these objects directly, and
+  SourceCatalog.readCSV() and ObserverArray.readCSV() read a
+  catalogue of sources and a table of stations from CSV files.
+"""
+#================================================================
+# Imports
+#----------------------------------------------------------------
+
+import re
+import csv
+import numpy
+import sidereal
+#================================================================
+# Manifest constants
+#----------------------------------------------------------------
+
+SIGN_PAT  =  re.compile ( r'[\-+]' )
+# - - -   p a r s e R A D e c
+
+def parseRADec ( rawRADec ):
+    """Validate and convert a pair of equatorial coordinates.
+
+      [ rawRADec is a string such as '08h37m05.6s+06d10m14.5s' ->
+          if rawRADec is a valid set of equatorial coordinates ->
+            return (ra, dec) in radians
+          else -> raise SyntaxError ]
+    """
+    #-- 1 --
+    m  =  SIGN_PAT.search ( rawRADec )
+    if  m is None:
+        raise SyntaxError ( "Equatorial coordinates must be separated by "
+                            "'+' or '-'." )
+    #-- 2 --
+    rawRA  =  rawRADec[:m.start()]
+    sign  =  m.group()
+    rawDec  =  rawRADec[m.end():]
+
+    #-- 3 --
+    try:
+        ra  =  sidereal.hoursToRadians ( sidereal.parseHours ( rawRA ) )
+    except SyntaxError:
+        raise SyntaxError ( "Right ascension '%s' should have the form "
+                            "'NNh[NNm[NN.NNNs]]'." % rawRA )
+    #-- 4 --
+    try:
+        absDec  =  sidereal.parseAngle ( rawDec )
+    except SyntaxError:
+        raise SyntaxError ( "Declination '%s' should have the form "
+                            "'NNd[NNm[NN.NNNs]]'." % rawDec )
+    #-- 5 --
+    if  sign == '-':   dec  =  - absDec
+    else:              dec  =  absDec
+
+    #-- 6 --
+    return (ra, dec)
+# - - -   p a r s e R A
+
+def parseRA ( rawRA ):
+    """Convert a right ascension.
+
+      [ rawRA is a string such as '08h37m05.6s', or a number of
+        degrees such as '129.273' ->
+          if rawRA is valid -> return it in radians
+          else -> raise SyntaxError ]
+    """
+    try:
+        return numpy.radians ( float ( rawRA ) )
+    except ValueError:
+        pass
+    try:
+        return sidereal.hoursToRadians ( sidereal.parseHours ( rawRA.strip() ) )
+    except SyntaxError:
+        raise SyntaxError ( "Right ascension '%s' should have the form "
+                            "'NNh[NNm[NN.NNNs]]' or be in degrees." % rawRA )
+# - - -   p a r s e D e c
+
+def parseDec ( rawDec ):
+    """Convert a declination.
+
+      [ rawDec is a string such as '+06d10m14.5s', or a number of
+        degrees such as '6.171' ->
+          if rawDec is valid -> return it in radians
+          else -> raise SyntaxError ]
+    """
+    try:
+        return numpy.radians ( float ( rawDec ) )
+    except ValueError:
+        pass
+    rawDec  =  rawDec.strip()
+    sign  =  rawDec[:1]
+    if  sign in ('+', '-'):
+        rawDec  =  rawDec[1:]
+    try:
+        absDec  =  sidereal.parseAngle ( rawDec )
+    except SyntaxError:
+        raise SyntaxError ( "Declination '%s' should have the form "
+                            "'NNd[NNm[NN.NNNs]]' or be in degrees." % rawDec )
+    if  sign == '-':   return - absDec
+    else:              return absDec
+# - - -   p a r s e L a t L o n
+
+def parseLatLon ( rawLat, rawLon ):
+    """Convert the location of a telescope.
+
+      [ rawLat and rawLon are strings such as '52d54m54.6sn' and
+        '6d52m11.7se', or numbers of degrees (north and east
+        positive) ->
+          if both are valid -> return (lat, lon) in radians
+          else -> raise SyntaxError ]
+    """
+    try:
+        lat  =  numpy.radians ( float ( rawLat ) )
+    except ValueError:
+        lat  =  sidereal.parseLat ( rawLat.strip() )
+    try:
+        lon  =  numpy.radians ( float ( rawLon ) )
+    except ValueError:
+        lon  =  sidereal.parseLon ( rawLon.strip() )
+    return (lat, lon)
+# - - -   r e a d R o w s
+
+def readRows ( filename, title ):
+    """Rows of a CSV file, without blank rows, comments and titles.
+
+      [ filename names a CSV file ->
+          return its rows as lists of stripped strings, without
+          the blank rows, the rows starting with '#' and a first
+          row whose second column starts with title ]
+    """
+    #-- 1 --
+    f  =  open ( filename, 'r' )
+    try:
+        rows  =  [ [x.strip() for x in row] for row in csv.reader ( f )
+                   if row and row[0].strip() and not row[0].strip().startswith('#') ]
+    finally:
+        f.close()
+
+    #-- 2 --
+    if  rows and len ( rows[0] ) > 1 and rows[0][1].lower().startswith ( title ):
+        rows  =  rows[1:]
+    return rows
+# - - - - -   c l a s s   S o u r c e
+
+class Source:
+    """A line of sight in equatorial coordinates.
+
+      Exports/Invariants:
+        .ra:      [ right ascension in radians, in [0,2*pi) ]
+        .dec:     [ declination in radians ]
+        .name:    [ name of the source, or None ]
+        .shape:   [ () ]
+    """
+    shape  =  ()
+
+    def __init__ ( self, ra, dec, name=None ):
+        self.ra  =  float ( ra ) % sidereal.TWO_PI
+        self.dec  =  float ( dec )
+        self.name  =  name
+
+#   @staticmethod
+    def fromString ( rawRADec, name=None ):
+        """Create a Source from a string such as
+        '08h37m05.6s+06d10m14.5s'; raise SyntaxError if invalid.
+        """
+        ra, dec  =  parseRADec ( rawRADec )
+        return Source ( ra, dec, name )
+    fromString  =  staticmethod ( fromString )
+
+    def __str__ ( self ):
+        return  str ( sidereal.RADec ( self.ra, self.dec ) )
+# - - - - -   c l a s s   S o u r c e C a t a l o g
+
+class SourceCatalog:
+    """Many lines of sight, as arrays.
+
+      Exports/Invariants:
+        .ra:      [ right ascensions in radians, in [0,2*pi) ]
+        .dec:     [ declinations in radians ]
+        .names:   [ list of names (None where unknown) ]
+        .shape:   [ (number of sources,) ]
+    """
+    def __init__ ( self, ra, dec, names=None ):
+        self.ra  =  numpy.atleast_1d ( numpy.asarray ( ra, dtype=float ) ) % sidereal.TWO_PI
+        self.dec  =  numpy.atleast_1d ( numpy.asarray ( dec, dtype=float ) )
+        if  self.ra.shape != self.dec.shape or self.ra.ndim != 1:
+            raise ValueError ( "ra and dec must be 1-D arrays of the same length" )
+        if  names is None:
+            names  =  [None] * len ( self.ra )
+        self.names  =  list ( names )
+        self.shape  =  self.ra.shape
+
+#   @staticmethod
+    def fromSources ( sources ):
+        """Create a SourceCatalog from a sequence of Source instances.
+        """
+        return SourceCatalog ( [s.ra for s in sources], [s.dec for s in sources],
+                               [s.name for s in sources] )
+    fromSources  =  staticmethod ( fromSources )
+
+#   @staticmethod
+    def fromStrings ( rawRADecs, names=None ):
+        """Create a SourceCatalog from strings such as
+        '08h37m05.6s+06d10m14.5s'; raise SyntaxError if one is invalid.
+        """
+        pairs  =  [ parseRADec ( raw ) for raw in rawRADecs ]
+        return SourceCatalog ( [p[0] for p in pairs], [p[1] for p in pairs], names )
+    fromStrings  =  staticmethod ( fromStrings )
+
+#   @staticmethod
+    def readCSV ( filename ):
+        """Create a SourceCatalog from a CSV file.
+
+          [ filename names a CSV file with one source per row, as
+            'name,RA,Dec' (see parseRA and parseDec) or as
+            'name,RA+dec' (see parseRADec); blank rows, rows
+            starting with '#' and a first row of column titles
+            are skipped ->
+              if every row is valid ->
+                return a SourceCatalog of the rows, in file order
+              else -> raise SyntaxError ]
+        """
+        #-- 1 --
+        rows  =  readRows ( filename, 'ra' )
+
+        #-- 2 --
+        names, ra, dec  =  [], [], []
+        for  k, row in enumerate ( rows ):
+            try:
+                if  len ( row ) == 2:
+                    r, d  =  parseRADec ( row[1] )
+                elif  len ( row ) >= 3:
+                    r, d  =  parseRA ( row[1] ), parseDec ( row[2] )
+                else:
+                    raise SyntaxError ( "Expected 'name,RA,Dec' or 'name,RA+dec'." )
+            except SyntaxError as detail:
+                raise SyntaxError ( "%s, source %d ('%s'): %s" % (filename, k+1, row[0], detail) )
+            names.append ( row[0] )
+            ra.append ( r )
+            dec.append ( d )
+
+        #-- 3 --
+        return SourceCatalog ( ra, dec, names )
+    readCSV  =  staticmethod ( readCSV )
+
+    def __len__ ( self ):
+        return  len ( self.ra )
+
+    def __getitem__ ( self, k ):
+        return  Source ( self.ra[k], self.dec[k], self.names[k] )
+# - - - - -   c l a s s   O b s e r v e r
+
+class Observer:
+    """The position of a telescope.
+
+      Exports/Invariants:
+        .lat:     [ latitude in radians, north positive ]
+        .lon:     [ east longitude in radians, in (-pi,pi] ]
+        .name:    [ name of the telescope, or None ]
+        .shape:   [ () ]
+    """
+    shape  =  ()
+
+    def __init__ ( self, lat, lon, name=None ):
+        self.lat  =  float ( lat )
+        self.lon  =  numpy.pi - ( numpy.pi - float ( lon ) ) % sidereal.TWO_PI
+        self.name  =  name
+
+#   @staticmethod
+    def fromStrings ( rawLat, rawLon, name=None ):
+        """Create an Observer from strings such as '52d54m54.6sn'
+        and '6d52m11.7se'; raise SyntaxError if invalid.
+        """
+        lat  =  sidereal.parseLat ( rawLat )
+        lon  =  sidereal.parseLon ( rawLon )
+        return Observer ( lat, lon, name )
+    fromStrings  =  staticmethod ( fromStrings )
+
+    def latLon ( self ):
+        """Return self as a sidereal.LatLon instance.
+        """
+        return  sidereal.LatLon ( self.lat, self.lon )
+
+    def __str__ ( self ):
+        return  str ( self.latLon() )
+# - - - - -   c l a s s   O b s e r v e r A r r a y
+
+class ObserverArray:
+    """Many telescopes, as arrays.
+
+      Exports/Invariants:
+        .lat:     [ latitudes in radians, north positive ]
+        .lon:     [ east longitudes in radians, in (-pi,pi] ]
+        .names:   [ list of names (None where unknown) ]
+        .shape:   [ (number of telescopes,) ]
+    """
+    def __init__ ( self, lat, lon, names=None ):
+        self.lat  =  numpy.atleast_1d ( numpy.asarray ( lat, dtype=float ) )
+        lon  =  numpy.atleast_1d ( numpy.asarray ( lon, dtype=float ) )
+        self.lon  =  numpy.pi - ( numpy.pi - lon ) % sidereal.TWO_PI
+        if  self.lat.shape != self.lon.shape or self.lat.ndim != 1:
+            raise ValueError ( "lat and lon must be 1-D arrays of the same length" )
+        if  names is None:
+            names  =  [None] * len ( self.lat )
+        self.names  =  list ( names )
+        self.shape  =  self.lat.shape
+
+#   @staticmethod
+    def fromObservers ( observers ):
+        """Create an ObserverArray from a sequence of Observer instances.
+        """
+        return ObserverArray ( [o.lat for o in observers], [o.lon for o in observers],
+                               [o.name for o in observers] )
+    fromObservers  =  staticmethod ( fromObservers )
+
+#   @staticmethod
+    def readCSV ( filename ):
+        """Create an ObserverArray from a CSV file.
+
+          [ filename names a CSV file with one telescope per row,
+            as 'name,lat,lon' (see parseLatLon); blank rows, rows
+            starting with '#' and a first row of column titles
+            are skipped ->
+              if every row is valid ->
+                return an ObserverArray of the rows, in file order
+              else -> raise SyntaxError ]
+        """
+        #-- 1 --
+        rows  =  readRows ( filename, 'lat' )
+
+        #-- 2 --
+        names, lat, lon  =  [], [], []
+        for  k, row in enumerate ( rows ):
+            try:
+                if  len ( row ) < 3:
+                    raise SyntaxError ( "Expected 'name,lat,lon'." )
+                la, lo  =  parseLatLon ( row[1], row[2] )
+            except SyntaxError as detail:
+                raise SyntaxError ( "%s, station %d ('%s'): %s" % (filename, k+1, row[0], detail) )
+            names.append ( row[0] )
+            lat.append ( la )
+            lon.append ( lo )
+
+        #-- 3 --
+        return ObserverArray ( lat, lon, names )
+    readCSV  =  staticmethod ( readCSV )
+
+    def __len__ ( self ):
+        return  len ( self.lat )
+
+    def __getitem__ ( self, k ):
+        return  Observer ( self.lat[k], self.lon[k], self.names[k] )
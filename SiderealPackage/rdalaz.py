@@ -11,130 +11,117 @@
 #----------------------------------------------------------------
 from __future__ import print_function
 
-import sys, re
+import sys, datetime
 import sidereal
+import altazarray
+import lineofsight
 from math import *
-#================================================================
-# Manifest consants
-#----------------------------------------------------------------
-
-SIGN_PAT  =  re.compile ( r'[\-+]' )
 # - - - - -   m a i n
 
-def alaz(tim):
+def alaz(tim, source=None, observer=None):
     """Main program for rdaa.
+
+      [ (tim is a date-time string or a datetime.datetime) and
+        (source is a lineofsight.Source, or None) and
+        (observer is a lineofsight.Observer, or None) ->
+          return (az, alt, h, |lat|, |lon|) in radians for source
+          seen by observer at tim; a missing source or observer
+          is taken from sys.argv ]
     """
 
     #-- 1 --
-    # [ if sys.argv contains a valid set of command line
+    # [ if source and observer are given ->
+    #     use them as they are, nothing is parsed
+    #   else if sys.argv contains a valid set of command line
     #   arguments ->
-    #     raDec  :=  the right ascension and declination as
-    #                a sidereal.RADec instance
-    #     latLon  :=  the observer's location as a
-    #                 sidereal.LatLon instance
-    #     dt  :=  the observer's date and time as a
-    #             datetime.datetime instance
+    #     source  :=  the line of sight as a lineofsight.Source
+    #     observer  :=  the observer's location as a
+    #                   lineofsight.Observer
     #   else ->
     #     sys.stderr  +:=  error message
     #     stop execution ]
-    raDec, latLon, dt  =  checkArgs(tim)
+    if  source is None or observer is None:
+        argSource, argObserver  =  checkLineOfSight()
+        if  source is None:    source  =  argSource
+        if  observer is None:  observer  =  argObserver
     #-- 2 --
-    # [ if dt has no time zone information ->
-    #     utc  :=  dt
-    #   else ->
-    #     utc  :=  the UTC equivalent to dt ]
-    if  ( (dt.tzinfo is None) or
-          (dt.utcoffset() is None) ):
-        utc  =  dt
+    # [ dt  :=  tim as a datetime.datetime instance ]
+    if  isinstance ( tim, datetime.datetime ):
+        dt  =  tim
     else:
-        utc  =  dt - dt.utcoffset()
+        try:
+            dt  =  sidereal.parseDatetime ( str(tim) )
+        except SyntaxError as detail:
+            usage ( "Invalid timestamp: %s" % detail )
     #-- 3 --
-    # [ sys.stdout  +:=  local sidereal time for dt and latLon ]
-    gst  =  sidereal.SiderealTime.fromDatetime ( utc )
-    lst  =  gst.lst ( latLon.lon )
-    #############print "Equatorial coordinates:", raDec
-    #############print "Observer's location:", latLon
-    #############print "Observer's time:", dt
-    #############print "Local sidereal time is", lst
-    #-- 4 --
-    # [ h  :=  hour angle for raDec at time (utc) and longitude
-    #          (latLon.lon) ]
-    h  =  raDec.hourAngle ( utc, latLon.lon )
-
-    #############print "Hour Angle:", h*180.0/pi,"d"
-
-    #-- 5 --
-    # [ aa  :=  horizon coordinates of raDec at hour angle h
-    #           as a sidereal.AltAz instance ]
-    aa  =  raDec.altAz ( h, latLon.lat )
-
-    #-- 6 --
-    #############print "Horizon coordinates:", aa
-# - - -   c h e c k A r g s
-
-    # changing latitude of the observer in degrees to radians
-    latdeg = latLon.__str__().split()[0].split('d')[0].split('[')[1]
-    latmin = latLon.__str__().split()[1].split("'")[0]
-    latsec = latLon.__str__().split()[2].split('"')[0]
-    latdegrees = float(latdeg) + float(latmin)/60.0 + float(latsec)/3600.0
-    latradians = latdegrees*pi/180.0
-    # changing longitude of the observer in degrees to radians
-    londeg = latLon.__str__().split()[5].split('d')[0]
-    lonmin = latLon.__str__().split()[6].split("'")[0]
-    lonsec = latLon.__str__().split()[7].split('"')[0]
-    londegrees = float(londeg) + float(lonmin)/60.0 + float(lonsec)/3600.0
-    lonradians = londegrees*pi/180.0
-    # changing azimuth  of the source in degrees to radians
-    azdeg = aa.__str__().split()[1].split('d')[0]
-    azmin = aa.__str__().split()[2].split("'")[0]
-    azsec = aa.__str__().split()[3].split('"')[0]
-    azdegrees = float(azdeg) + float(azmin)/60.0 + float(azsec)/3600.0
-    azradians = azdegrees*pi/180.0	
-    # changing elevation or altitude of the source in degrees to radians
-    aldeg = aa.__str__().split()[5].split('d')[0]
-    almin = aa.__str__().split()[6].split("'")[0]
-    alsec = aa.__str__().split()[7].split('"')[0]
-    aldegrees = float(aldeg) + float(almin)/60.0 + float(alsec)/3600.0
-    alradians = aldegrees*pi/180.0
+    # [ az, alt  :=  horizon coordinates of source at dt as seen
+    #                by observer
+    #   h  :=  hour angle of source at time dt and the observer's
+    #          longitude ]
+    az, alt, h, lat, lon  =  altazarray.horizon ( source, observer, dt )
 
+    #-- 4 --
+    # [ the observer's latitude and longitude are returned
+    #   without their sign (hemispheres are given by the
+    #   'n'/'s' and 'e'/'w' of the command line) ]
     # all the values are returned in radians!
-    return azradians, alradians, h, latradians, lonradians
+    return float(az[0]), float(alt[0]), float(h[0]), abs(float(lat[0])), abs(float(lon[0]))
 
 
-def checkArgs(ti):
-    """Process all command line arguments.
+def checkLineOfSight ( argList=None ):
+    """Parse the line of sight and the observer's location.
 
-      [ if sys.argv[1:] is a valid set of command line arguments ->
-          return (raDec, latLon, dt) where raDec is a set of
-          celestial coordinates as a sidereal.RADec instance,
-          latLon is position as a sidereal.LatLon instance, and
-          dt is a datetime.datetime instance
-        else ->
-          sys.stderr  +:=  error message
-          stop execution ]
+      [ argList is a list of command line arguments (default
+        sys.argv[1:]) ->
+          if argList is a valid set of command line arguments ->
+            return (source, observer) as lineofsight.Source and
+            lineofsight.Observer instances
+          else ->
+            sys.stderr  +:=  error message
+            stop execution ]
     """
     #-- 1 --
-    # [ if sys.argv[1:] has exactly four elements ->
-    #     rawRADec, rawLat, rawLon, rawDT  :=  those elements
+    # [ if argList has exactly five elements ->
+    #     rawRADec, rawLat, rawLon, rawDT, fileIONEXTEC  :=
+    #         those elements
     #   else ->
     #     sys.stderr  +:=  error message
     #     stop execution ]
-    argList  =  sys.argv[1:]
+    if  argList is None:
+        argList  =  sys.argv[1:]
     if  len(argList) != 5:
         usage ("Incorrect command line argument count." )
-    else:
-        rawRADec, rawLat, rawLon, rawDT, fileIONEXTEC  =  argList
-        rawDT = str(ti)
-	
+    rawRADec, rawLat, rawLon, rawDT, fileIONEXTEC  =  argList
+
     #-- 2 --
     # [ if rawRADec is a valid set of equatorial coordinates ->
-    #     raDec  :=  those coordinates as a sidereal.RADec instance
+    #     source  :=  those coordinates as a lineofsight.Source
     #   else ->
     #     sys.stderr  +:=  error message
     #     stop execution ]
     raDec  =  checkRADec ( rawRADec )
+    source  =  lineofsight.Source ( raDec.ra, raDec.dec )
 
     #-- 3 --
+    # [ if rawLat and rawLon are a valid latitude and longitude ->
+    #     return (source, that location as a lineofsight.Observer)
+    #   else ->
+    #     sys.stderr  +:=  error message
+    #     stop execution ]
+    return (source, checkObserver ( rawLat, rawLon ))
+# - - -   c h e c k O b s e r v e r
+
+def checkObserver ( rawLat, rawLon ):
+    """Parse the observer's location.
+
+      [ rawLat and rawLon are strings ->
+          if they are a valid latitude and longitude ->
+            return them as a lineofsight.Observer instance
+          else ->
+            sys.stderr  +:=  error message
+            stop execution ]
+    """
+    #-- 1 --
     # [ if rawLat is a valid latitude ->
     #     lat  :=  that latitude in radians
     #   else ->
@@ -145,7 +132,7 @@ def checkArgs(ti):
     except SyntaxError as detail:
         usage ( "Invalid latitude: %s" % detail )
 
-    #-- 4 --
+    #-- 2 --
     # [ if rawLon is a valid longitude ->
     #     lon  :=  that longitude in radians
     #   else ->
@@ -156,20 +143,45 @@ def checkArgs(ti):
     except SyntaxError as detail:
         usage ( "Invalid longitude: %s" % detail )
 
-    #-- 5 --
-    # [ if rawDT is a valid date-time string ->
+    #-- 3 --
+    return lineofsight.Observer ( lat, lon )
+
+
+def checkArgs(ti):
+    """Process all command line arguments.
+
+      [ if sys.argv[1:] is a valid set of command line arguments ->
+          return (raDec, latLon, dt) where raDec is a set of
+          celestial coordinates as a sidereal.RADec instance,
+          latLon is position as a sidereal.LatLon instance, and
+          dt is a datetime.datetime instance for the timestamp ti
+        else ->
+          sys.stderr  +:=  error message
+          stop execution ]
+    """
+    #-- 1 --
+    # [ if sys.argv[1:] is a valid set of command line arguments ->
+    #     source, observer  :=  the line of sight and the
+    #         observer's location (see checkLineOfSight)
+    #   else ->
+    #     sys.stderr  +:=  error message
+    #     stop execution ]
+    source, observer  =  checkLineOfSight()
+
+    #-- 2 --
+    # [ if ti is a valid date-time string ->
     #     dt  :=  that date-time as a datetime.datetime instance
     #   else ->
     #     sys.stderr  +:=  error message
     #     stop execution ]
     try:
-        dt  =  sidereal.parseDatetime ( rawDT )
+        dt  =  sidereal.parseDatetime ( str(ti) )
     except SyntaxError as detail:
         usage ( "Invalid timestamp: %s" % detail )
 
-    #-- 6 --
-    latLon  =  sidereal.LatLon ( lat, lon )
-    return  (raDec, latLon, dt)
+    #-- 3 --
+    raDec  =  sidereal.RADec ( source.ra, source.dec )
+    return  (raDec, observer.latLon(), dt)
 # - - -   u s a g e
 
 def usage ( *L ):
@@ -199,50 +211,17 @@ def checkRADec ( rawRADec ):
             stop execution ]
     """
     #-- 1 --
-    # [ if rawRADec contains either a '+' or a '-' ->
-    #     m  :=  a re.match instance describing the first matching
-    #            character
-    #   else ->
-    #     sys.stderr  +:=  error message
-    #     stop execution ]
-    m  =  SIGN_PAT.search ( rawRADec )
-    if  m is None:
-        usage ( "Equatorial coordinates must be separated by "
-                "'+' or '-'." )
-    #-- 2 --
-    # [ rawRA  :=  rawRADec up to the match described by m
-    #   sign  :=  characters matched by m
-    #   rawDec  :=  rawRADec past the match described by m ]
-    rawRA  =  rawRADec[:m.start()]
-    sign  =  m.group()
-    rawDec  =  rawRADec[m.end():]
-    #-- 3 --
-    # [ if rawRA is a valid hours expression ->
-    #     ra  :=  rawRA as radians
+    # [ if rawRADec is a valid set of equatorial coordinates ->
+    #     ra, dec  :=  those coordinates in radians
     #   else ->
     #     sys.stderr  +:=  error message
     #     stop execution ]
     try:
-        raHours  =  sidereal.parseHours ( rawRA )
-        ra  =  sidereal.hoursToRadians ( raHours )
-    except SyntaxError as detail:
-        usage ( "Right ascension '%s' should have the form "
-                "'NNh[NNm[NN.NNNs]]'." % rawRA )
-    #-- 4 --
-    # [ if rawDec is a valid angle expression ->
-    #     absDec  :=  that angle in radians
-    #     sys.stderr  +:=  error message
-    #     stop execution ]
-    try:
-        absDec  =  sidereal.parseAngle ( rawDec )
+        ra, dec  =  lineofsight.parseRADec ( rawRADec )
     except SyntaxError as detail:
-        usage ( "Right ascension '%s' should have the form "
-                "'NNd[NNm[NN.NNNs]]'." % rawDec )
-    #-- 5 --
-    if  sign == '-':   dec  =  - absDec
-    else:              dec  =  absDec
+        usage ( str(detail) )
 
-    #-- 6 --
+    #-- 2 --
     return sidereal.RADec ( ra, dec )
 #================================================================
 # Epilogue
@@ -22,6 +22,42 @@
 #
 # NOTE: Actually due to problems with the 'sidereal' package we only
 # obtain 24 RM values (from 00~23)
+#
+# The computation itself is done by ionrm.predict(), which can
+# also be imported and called directly.
+#
+# With --end (and --step) any time range and cadence can be used
+# instead: the series goes from the date/time given to --end every
+# --step seconds (default 3600), and the first column of IonRM.txt
+# is then the full UT date and time of every sample, e.g.
+#   ionFRM.py ... 2011-10-20T22:00:00 codg2930.11i --end 2011-10-21T06:00:00 --step 10
+# Epochs of a range on other days than the one of the IONEX file
+# given use the files of those days when they are next to it (e.g.
+# codg2940.11i after 00:00 UT of the 21st, see IONEX/ionexseries.py).
+#
+# With --catalog FILE the RA+dec argument is left out and every
+# source of a CSV file (rows of 'name,RA,Dec', see
+# lineofsight.SourceCatalog.readCSV) is computed in one go; every
+# row of IonRM.txt then starts with the name of its source.
+# --elevation sets the lowest altitude (degrees) of the source for
+# which the RM is given (0, the horizon, by default).
+#
+# Likewise, with --stations FILE the lat and lon arguments are left
+# out and the RM is computed for every telescope of a CSV file (rows
+# of 'name,lat,lon', see lineofsight.ObserverArray.readCSV), with the
+# same IONEX maps and IGRF coefficients; every row of IonRM.txt then
+# starts with the name of its station (and then of its source).
+#
+# The rows are written when the run ends (see ionwriter.py): they
+# are added to ./IonRM.txt in one go, or with --output PATH written
+# to a new file that replaces PATH only once it is complete.
+# --format npz writes instead typed columns (epoch, station and
+# source ids, TEC, field, RM, RM error and IPP coordinates) to the
+# .npz file PATH, and --format store appends them to the chunked
+# store (a directory) PATH, see ionwriter.columns and ionstore.py.
+# With --end the store is filled a chunk of epochs at a time as they
+# are computed (see ionrm.stream), so ranges of any length can be
+# written with bounded memory.
 #-----------------------------------------------------------
 
 # `path` is the variable describing where the ionFR code is. Determine this
@@ -32,122 +68,119 @@ path = os.path.dirname(os.path.realpath(__file__)) + "/"
 #-----------------------------------------------------------
 
 import sys
-import math
-from scipy import pi
+import optparse as op
+import numpy
 
 # Add ionFR modules to the PYTHONPATH (internally, this is sys.path).
 sys.path.append(""+str(path)+"SiderealPackage")
-sys.path.append(""+str(path)+"PunctureIonosphereCoord")
-sys.path.append(""+str(path)+"IONEX")
 import rdalaz
+import lineofsight
 from rdalaz import usage
-import ippcoor_v1 as ippcoor
-import teccalc
-import tecrmscalc
-import ionheight
-
-# Defining some variables for further use
-TECU = pow(10,16)
-TEC2m2 = 0.1*TECU
-EarthRadius = 6371000.0 # in meters
-Tesla2Gauss = pow(10,4)
-
-# Cheking the arguments are given correctly
-argList  =  sys.argv[1:]
-if  len(argList) != 5:
-	usage ("Incorrect command line argument count.")
-else:
-	rawRAscencionDeclination, rawLatitude, rawLongitude, rawDTime, nameIONEX  =  argList
-
-# predict the ionospheric RM for every hour within a day 
-for h in range(24):
-	if h < 10:
-		rawtime = str(rawDTime.split('T')[0]+'T0'+str(h)+':00:00')
+import ionrm
+import ionexseries
+import ionwriter
+import ionstore
+
+def main(argList):
+
+	p = op.OptionParser(usage='%prog RA+dec lat lon datetime IONEX_file [--end datetime [--step seconds]]\n'
+		'       %prog --catalog sources.csv lat lon datetime IONEX_file [...]\n'
+		'       %prog --stations stations.csv RA+dec datetime IONEX_file [...]')
+	p.add_option('--end', '-e', default=None, type='string', help='End of the time range (YYYY-MM-DDTHH:MM:SS)')
+	p.add_option('--step', '-s', default=3600.0, type='float', help='Time step in seconds [3600 default]')
+	p.add_option('--catalog', '-c', default=None, type='string', help='CSV file of sources (name,RA,Dec)')
+	p.add_option('--stations', default=None, type='string', help='CSV file of telescopes (name,lat,lon)')
+	p.add_option('--output', '-o', default=None, type='string', help='Output file, replaced when the run ends [rows appended to ./IonRM.txt default]')
+	p.add_option('--format', '-f', default='text', type='choice', choices=['text', 'npz', 'store'],
+		help='Output format: text (IonRM.txt rows), npz or store (need --output) [text default]')
+	p.add_option('--elevation', default=0.0, type='float', help='Elevation mask in degrees [0 default]')
+	ops, argList = p.parse_args(argList)
+	if ops.format != 'text' and ops.output is None:
+		usage ("--format %s needs --output." % ops.format)
+
+	# Cheking the arguments are given correctly (RA+dec is left out
+	# with --catalog, and lat and lon with --stations)
+	count = 5
+	if ops.catalog is not None:
+		count = count - 1
+	if ops.stations is not None:
+		count = count - 2
+	if  len(argList) != count:
+		usage ("Incorrect command line argument count.")
+	args = list(argList)
+	rawDTime, nameIONEX = args[-2:]
+
+	# Parsing the line of sight (or reading the catalogue of sources)
+	if ops.catalog is None:
+		rawRADec = args.pop(0)
+		raDec = rdalaz.checkRADec(rawRADec)
+		source = lineofsight.Source(raDec.ra, raDec.dec, rawRADec)
 	else:
-		rawtime = str(rawDTime.split('T')[0]+'T'+str(h)+':00:00')
-	
-	hour = rawtime.split('T')[1].split(':')[0]
-	date = rawtime.split('T')[0].split('-')
-	year = rawtime.split('T')[0].split('-')[0]
-	month = rawtime.split('T')[0].split('-')[1]
-	day = rawtime.split('T')[0].split('-')[2]
-
-	# RA and Dec (of the source in degrees) to Alt and Az (radians)
-	AzS,AlS,HA,LatO,LonO = rdalaz.alaz(rawtime)
-	ZenS = (pi/2.0) - AlS
-
-	# output data only when the altitude of the source is above 0 degrees
-	if AlS*(180.0/pi) > 0: 
-
-		# Reading the altitude of the Ionosphere in km (from IONEX file)
-		AltIon = ionheight.calcionheight(nameIONEX)
-		AltIon = AltIon*1000.0 # km to m
-
-		# Alt and AZ coordinates of the Ionospheric piercing point
-		# Lon and Lat distances wrt the location of the antenna are also 
-		# calculated (radians)
-		offLat,offLon,AzPunct,ZenPunct = ippcoor.PuncIonOffset(LatO,AzS,ZenS,AltIon)
-		AlSPunct = (pi/2.0) - ZenPunct
-
-		# Calculation of TEC path value for the indicated 'hour' and therefore 
-		# at the IPP
-		if rawLatitude[-1] == 's':
-			if rawLongitude[-1] == 'e':
-				TECarr = teccalc.calcTEC(-(LatO + offLat)*180.0/pi,(LonO + offLon)*180.0/pi,nameIONEX)
-			if rawLongitude[-1] == 'w':
-				TECarr = teccalc.calcTEC(-(LatO + offLat)*180.0/pi,-(LonO + offLon)*180.0/pi,nameIONEX)
-		if rawLatitude[-1] == 'n':
-			if rawLongitude[-1] == 'e':
-				TECarr = teccalc.calcTEC((LatO + offLat)*180.0/pi,(LonO + offLon)*180.0/pi,nameIONEX)
-			if rawLongitude[-1] == 'w':
-				TECarr = teccalc.calcTEC((LatO + offLat)*180.0/pi,-(LonO + offLon)*180.0/pi,nameIONEX)
-		VTEC = TECarr[int(hour)]
-		TECpath = VTEC*TEC2m2/math.cos(ZenPunct) # from vertical TEC to line of sight TEC
-
-		# Calculation of RMS TEC path value (same as the step above)
-		if rawLatitude[-1] == 's':
-			if rawLongitude[-1] == 'e':
-				RMSTECarr = tecrmscalc.calcRMSTEC(-(LatO + offLat)*180.0/pi,(LonO + offLon)*180.0/pi,nameIONEX)
-			if rawLongitude[-1] == 'w':
-				RMSTECarr = tecrmscalc.calcRMSTEC(-(LatO + offLat)*180.0/pi,-(LonO + offLon)*180.0/pi,nameIONEX)
-		if rawLatitude[-1] == 'n':
-			if rawLongitude[-1] == 'e':
-				RMSTECarr = tecrmscalc.calcRMSTEC((LatO + offLat)*180.0/pi,(LonO + offLon)*180.0/pi,nameIONEX)
-			if rawLongitude[-1] == 'w':
-				RMSTECarr = tecrmscalc.calcRMSTEC((LatO + offLat)*180.0/pi,-(LonO + offLon)*180.0/pi,nameIONEX)
-		VRMSTEC = RMSTECarr[int(hour)]
-		RMSTECpath = VRMSTEC*TEC2m2/math.cos(ZenPunct) # from vertical RMS TEC to line of sight RMS TEC
-
-		# Calculation of the total magnetic field along the line of sight at the IPP
-		f = open(''+str(path)+'IGRF/geomag70_linux/input.txt', 'w')
-		if rawLatitude[-1] == 's':
-			if rawLongitude[-1] == 'e':
-				f.write(''+str(year)+','+str(month)+','+str(day)+' C K'+str((EarthRadius+AltIon)/1000.0)+' '+str(-(LatO + offLat)*180.0/pi)+' '+str((LonO + offLon)*180.0/pi)+'')
-			if rawLongitude[-1] == 'w':
-				f.write(''+str(year)+','+str(month)+','+str(day)+' C K'+str((EarthRadius+AltIon)/1000.0)+' '+str(-(LatO + offLat)*180.0/pi)+' '+str(-(LonO + offLon)*180.0/pi)+'')
-		if rawLatitude[-1] == 'n':
-			if rawLongitude[-1] == 'e': 
-				f.write(''+str(year)+','+str(month)+','+str(day)+' C K'+str((EarthRadius+AltIon)/1000.0)+' '+str((LatO + offLat)*180.0/pi)+' '+str((LonO + offLon)*180.0/pi)+'')
-			if rawLongitude[-1] == 'w':
-				f.write(''+str(year)+','+str(month)+','+str(day)+' C K'+str((EarthRadius+AltIon)/1000.0)+' '+str((LatO + offLat)*180.0/pi)+' '+str(-(LonO + offLon)*180.0/pi)+'')
-		f.close()
-		os.system(''+str(path)+'IGRF/geomag70_linux/geomag70.exe '+str(path)+'IGRF/geomag70_linux/IGRF13.COF f '+str(path)+'IGRF/geomag70_linux/input.txt '+str(path)+'IGRF/geomag70_linux/output.txt')
-		g = open(''+str(path)+'IGRF/geomag70_linux/output.txt', 'r')
-		data = g.readlines()
-		g.close()
-
-		Xfield = abs(float(data[1].split()[10]))
-		Yfield = abs(float(data[1].split()[11]))
-		Zfield = abs(float(data[1].split()[12]))
-		Xfield = Xfield*pow(10,-9)*Tesla2Gauss
-		Yfield = Yfield*pow(10,-9)*Tesla2Gauss
-		Zfield = Zfield*pow(10,-9)*Tesla2Gauss
-		Totfield = Zfield*math.cos(ZenPunct) + Yfield*math.sin(ZenPunct)*math.sin(AzPunct) - Xfield*math.sin(ZenPunct)*math.cos(AzPunct)
-
-		# Saving the Ionosheric RM and its corresponding
-		# rms value to a file for the given 'hour' value
-		IFR = 2.6*pow(10,-17)*Totfield*TECpath
-		RMSIFR = 2.6*pow(10,-17)*Totfield*RMSTECpath
-		f = open(''+str(os.getcwd())+'/IonRM.txt', 'a')
-		f.write(''+str(hour)+' '+str(TECpath)+' '+str(Totfield)+' '+str(IFR)+' '+str(RMSIFR)+'\n')
-
+		try:
+			source = lineofsight.SourceCatalog.readCSV(ops.catalog)
+		except (IOError, SyntaxError) as detail:
+			usage ("Invalid catalogue: %s" % detail)
+
+	# and the location of the observer (or the table of stations)
+	if ops.stations is None:
+		observer = rdalaz.checkObserver(args[0], args[1])
+		observer.name = ''+args[0]+' '+args[1]
+	else:
+		try:
+			observer = lineofsight.ObserverArray.readCSV(ops.stations)
+		except (IOError, SyntaxError) as detail:
+			usage ("Invalid table of stations: %s" % detail)
+
+	if ops.end is None:
+		# predict the ionospheric RM for every hour within a day 
+		day = numpy.datetime64(rawDTime.split('T')[0], 'D')
+		times = day + numpy.arange(24)*numpy.timedelta64(1, 'h')
+		ionex = nameIONEX
+	else:
+		# or from the date/time given to --end every --step seconds
+		try:
+			times = ionrm.epochRange(numpy.datetime64(rawDTime), numpy.datetime64(ops.end), ops.step)
+		except ValueError as detail:
+			usage ("Invalid time range: %s" % detail)
+		ionex = ionexseries.IONEXSeries(nameIONEX)
+
+	if ops.format == 'store' and ops.end is not None:
+		# long ranges: every chunk is stored as soon as it is computed
+		store = ionstore.ColumnStore(ops.output)
+		for result in ionrm.stream(source, observer, numpy.datetime64(rawDTime), ionex, numpy.datetime64(ops.end), ops.step,
+				elevationMask=ops.elevation):
+			store.append(ionwriter.columns(result, _names(observer), _names(source)))
+		return
+	result = ionrm.predict(source, observer, times, ionex, elevationMask=ops.elevation)
+
+	# Saving the Ionosheric RM and its corresponding rms value to
+	# a file, for the samples with the source above the elevation mask
+	labels = []
+	if ops.stations is not None:
+		labels.append(observer.names)
+	if ops.catalog is not None:
+		labels.append(source.names)
+	if ops.end is None:
+		stamps = 'hour'
+	else:
+		stamps = 'iso'
+	if ops.format == 'npz':
+		ionwriter.writeNPZ(ops.output, result, _names(observer), _names(source))
+	elif ops.format == 'store':
+		ionstore.ColumnStore(ops.output).append(ionwriter.columns(result, _names(observer), _names(source)))
+	else:
+		if ops.output is None:
+			writer = ionwriter.ResultWriter(''+str(os.getcwd())+'/IonRM.txt', append=True)
+		else:
+			writer = ionwriter.ResultWriter(ops.output)
+		with writer:
+			writer.write(result, stamps, labels)
+
+def _names(where):
+	# names of a catalogue or array, or the name of a single one
+	if hasattr(where, 'names'):
+		return where.names
+	return where.name
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------
+# Batch runner: ionFRM.py for every job of a manifest.
+# @version 1.0
+#
+# A manifest is a CSV file with one job per row,
+#
+#   id,RA+dec,lat,lon,datetime,IONEX_file[,end[,step]]
+#
+# i.e. the arguments of ionFRM.py (lat and lon can also
+# be degrees, north and east positive) after a unique
+# job id. Without 'end' a job covers every hour of the
+# day of 'datetime', as ionFRM.py does; with it, the
+# range from 'datetime' to 'end' every 'step' seconds
+# (3600 by default). IONEX file names are relative to
+# the directory of the manifest. A first row of column
+# titles and rows starting with '#' are skipped. Ids
+# are file names: they cannot contain path separators
+# or start with '.'.
+#
+# Jobs are grouped by IONEX file and the groups (split
+# in chunks of at most 'chunkSize' jobs) are run by a
+# pool of 'workers' processes, so every file is parsed
+# at most once per worker (see ionexcache). Every job
+# writes the rows of IonRM.txt it would have produced
+# to <output>/<id>.txt (which only appears once it is
+# complete, see ionwriter). The id of every job that has
+# finished is then appended to a checkpoint file
+# (<output>/ionbatch.done by default) by the parent
+# process; jobs already listed there are skipped, so a
+# run that is interrupted is resumed by running it
+# again. Jobs that fail are reported on stderr and run
+# again next time.
+#
+# With more than one worker the parent parses every
+# IONEX file itself and publishes its maps once in
+# shared memory (see IONEX/ionexshared.py); the workers
+# map them read-only instead of each reading the file,
+# and the block of a file is released as soon as its
+# last chunk is done. Only 2*workers chunks are queued
+# at a time, so only the files of those chunks are held.
+#
+# Usage:
+#	ionbatch.py manifest.csv --output results --workers 8
+#
+#	import ionbatch
+#	done, failed = ionbatch.run('manifest.csv', 'results', workers=8)
+#-----------------------------------------------------------
+
+import os
+import sys
+import csv
+import queue
+import optparse as op
+import multiprocessing
+
+import numpy
+
+import ionrm
+import lineofsight
+import ionexseries
+import ionexshared
+import ionwriter
+
+# Largest number of jobs sent to a worker at once
+chunkSize = 64
+
+class Job(object):
+	"""One row of a manifest."""
+
+	def __init__(self, jobId, source, observer, start, ionex, end=None, step=3600.0):
+		self.jobId = jobId
+		self.source = source
+		self.observer = observer
+		self.start = start
+		self.ionex = ionex
+		self.end = end
+		self.step = step
+
+	def times(self):
+		"""UTC epochs of the job."""
+		if self.end is None:
+			day = numpy.datetime64(self.start, 'D')
+			return day + numpy.arange(24)*numpy.timedelta64(1, 'h')
+		return ionrm.epochRange(self.start, self.end, self.step)
+
+def readManifest(filename):
+	"""Jobs of a manifest file, in file order. Raise ValueError
+	for invalid rows and repeated ids."""
+	folder = os.path.dirname(os.path.abspath(filename))
+	f = open(filename, 'r')
+	try:
+		rows = [[x.strip() for x in row] for row in csv.reader(f)
+			if row and row[0].strip() and not row[0].strip().startswith('#')]
+	finally:
+		f.close()
+	if rows and len(rows[0]) > 1 and rows[0][1].lower().startswith('ra'):
+		rows = rows[1:]
+
+	jobs = []
+	seen = set()
+	for k, row in enumerate(rows):
+		try:
+			if len(row) < 6:
+				raise ValueError('expected id,RA+dec,lat,lon,datetime,IONEX_file[,end[,step]]')
+			jobId = row[0]
+			if not jobId or jobId.startswith('.') or os.sep in jobId or (os.altsep and os.altsep in jobId):
+				# the id names the result file in the output directory
+				raise ValueError('invalid id %r (empty, starting with . or with a path separator)' % jobId)
+			if jobId in seen:
+				raise ValueError('repeated id')
+			seen.add(jobId)
+			ra, dec = lineofsight.parseRADec(row[1])
+			lat, lon = lineofsight.parseLatLon(row[2], row[3])
+			start = numpy.datetime64(row[4])
+			end = None
+			step = 3600.0
+			if len(row) > 6 and row[6]:
+				end = numpy.datetime64(row[6])
+				if end < start:
+					raise ValueError('end is before start')
+			if len(row) > 7 and row[7]:
+				step = float(row[7])
+				if not step > 0.0:
+					raise ValueError('step must be positive')
+		except (SyntaxError, ValueError) as detail:
+			raise ValueError('%s, row %d: %s' % (filename, k+1, detail))
+		jobs.append(Job(jobId, lineofsight.Source(ra, dec, jobId), lineofsight.Observer(lat, lon),
+			start, os.path.join(folder, row[5]), end, step))
+	return jobs
+
+def groupJobs(jobs, size=None):
+	"""Jobs grouped by IONEX file, in chunks of at most 'size'."""
+	if size is None:
+		size = chunkSize
+	size = max(1, int(size))
+	groups = {}
+	for job in jobs:
+		groups.setdefault(os.path.realpath(job.ionex), []).append(job)
+	chunks = []
+	for name in sorted(groups):
+		group = groups[name]
+		chunks.extend([group[k:k+size] for k in range(0, len(group), size)])
+	return chunks
+
+def runJob(job, output):
+	"""Compute one job and write its rows to <output>/<id>.txt."""
+	times = job.times()
+	if job.end is None:
+		ionex = job.ionex
+	else:
+		ionex = ionexseries.IONEXSeries(job.ionex)
+	result = ionrm.predict(job.source, job.observer, times, ionex)
+
+	if job.end is None:
+		stamps = 'hour'
+	else:
+		stamps = 'iso'
+	with ionwriter.ResultWriter(os.path.join(output, job.jobId + '.txt')) as writer:
+		writer.write(result, stamps)
+
+def runChunk(chunk, output):
+	"""Run the jobs of a chunk; (id, error or None) for every one."""
+	status = []
+	for job in chunk:
+		try:
+			runJob(job, output)
+			status.append((job.jobId, None))
+		except Exception as detail:
+			status.append((job.jobId, '%s: %s' % (type(detail).__name__, detail)))
+	return status
+
+def _runChunk(chunk, output, handle=None):
+	# in a worker: the IONEX file of the chunk is taken from
+	# shared memory while the chunk runs
+	if handle is None:
+		return runChunk(chunk, output)
+	try:
+		ionexshared.attach(handle)
+	except (IOError, OSError):
+		# not there any more: read from the file instead
+		return runChunk(chunk, output)
+	try:
+		return runChunk(chunk, output)
+	finally:
+		ionexshared.detach(handle)
+
+def readCheckpoint(filename):
+	"""Ids of the jobs listed in a checkpoint file."""
+	if not os.path.exists(filename):
+		return set()
+	f = open(filename, 'r')
+	try:
+		return set([line.strip() for line in f if line.strip()])
+	finally:
+		f.close()
+
+def run(manifest, output, workers=None, checkpoint=None, size=None):
+	"""Run the jobs of a manifest not yet in the checkpoint file.
+	Return the number of jobs done and the list of (id, error)
+	of the failed ones."""
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	if checkpoint is None:
+		checkpoint = os.path.join(output, 'ionbatch.done')
+	if not os.path.isdir(output):
+		os.makedirs(output)
+
+	finished = readCheckpoint(checkpoint)
+	jobs = [job for job in readManifest(manifest) if job.jobId not in finished]
+	chunks = groupJobs(jobs, size)
+
+	done = 0
+	failed = []
+	f = open(checkpoint, 'a')
+	try:
+		def record(status):
+			for jobId, error in status:
+				if error is None:
+					f.write(jobId + '\n')
+				else:
+					failed.append((jobId, error))
+					print('ionbatch: job %s failed: %s' % (jobId, error), file=sys.stderr)
+			# flushed after every chunk, so that an interrupted run
+			# loses at most the chunks still being computed
+			f.flush()
+			os.fsync(f.fileno())
+			return len([s for s in status if s[1] is None])
+
+		if workers <= 1 or len(chunks) <= 1:
+			for chunk in chunks:
+				done += record(runChunk(chunk, output))
+		else:
+			done += _runPool(chunks, output, min(workers, len(chunks)), record)
+	finally:
+		f.close()
+	return done, failed
+
+def _runPool(chunks, output, workers, record):
+	# every file is published with its first chunk, for all its
+	# chunks; they follow each other (see groupJobs), so its maps
+	# are released soon after they are queued
+	uses = {}
+	for chunk in chunks:
+		name = os.path.realpath(chunk[0].ionex)
+		uses[name] = uses.get(name, 0) + 1
+	handles = {}
+
+	results = queue.Queue()
+	ionexshared.prepareWorkers()
+	pool = multiprocessing.Pool(workers)
+	done = 0
+	try:
+		def collect():
+			status, handle = results.get()
+			if handle is not None:
+				ionexshared.release(handle)
+			if isinstance(status, BaseException):
+				raise status
+			return record(status)
+
+		queued = 0
+		for chunk in chunks:
+			if queued >= 2*workers:
+				done += collect()
+				queued -= 1
+			name = os.path.realpath(chunk[0].ionex)
+			if name not in handles:
+				try:
+					handles[name] = ionexshared.publish(chunk[0].ionex, uses=uses[name])
+				except (IOError, OSError, ValueError):
+					# the jobs fail (and say why) in the worker
+					handles[name] = None
+			handle = handles[name]
+			pool.apply_async(_runChunk, (chunk, output, handle),
+				callback=lambda status, handle=handle: results.put((status, handle)),
+				error_callback=lambda error, handle=handle: results.put((error, handle)))
+			queued += 1
+		while queued > 0:
+			done += collect()
+			queued -= 1
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+		ionexshared.releaseAll()
+	return done
+
+def main(argList):
+
+	p = op.OptionParser(usage='%prog manifest.csv [--output DIR] [--workers N] [--checkpoint FILE]')
+	p.add_option('--output', '-o', default='.', type='string', help='Directory of the results [current directory default]')
+	p.add_option('--workers', '-w', default=None, type='int', help='Number of worker processes [number of CPUs default]')
+	p.add_option('--checkpoint', default=None, type='string', help='Checkpoint file [OUTPUT/ionbatch.done default]')
+	p.add_option('--chunk', default=None, type='int', help='Largest number of jobs per task [%d default]' % chunkSize)
+	ops, args = p.parse_args(argList)
+	if len(args) != 1:
+		p.error('one manifest file is needed')
+
+	try:
+		done, failed = run(args[0], ops.output, ops.workers, ops.checkpoint, ops.chunk)
+	except (IOError, ValueError) as detail:
+		p.error(str(detail))
+	print('ionbatch: %d jobs done, %d failed' % (done, len(failed)), file=sys.stderr)
+	if failed:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------
+# Ionospheric Faraday rotation (RM) along a line of sight,
+# as a library function.
+# @version 1.0
+#
+# predict() does what ionFRM.py does for every hour of a
+# day, for any number of epochs at once and without
+# writing any file: the source is converted to horizon
+# coordinates, the line of sight is intersected with the
+# thin ionospheric shell of the IONEX file (the IPP), the
+# vertical TEC (and its RMS) at the IPP is interpolated
+# in the IONEX maps and projected on the line of sight,
+# and the geomagnetic field (IGRF) at the IPP is
+# projected on it too.
+#
+# The source and the observer can also be a catalogue
+# (lineofsight.SourceCatalog) and an array of stations
+# (lineofsight.ObserverArray); all the outputs then have
+# the shape observer.shape + source.shape + times.shape
+# (see altazarray.horizon). The parsed IONEX file, the
+# IGRF model and its coefficients are all cached, so a
+# warm process can serve any number of calls. For a
+# catalogue of sources (e.g. from
+# lineofsight.SourceCatalog.readCSV) all the sources and
+# epochs are computed together as arrays, and the
+# elevation mask is applied to all of them at once.
+#
+# Input:
+#	source		lineofsight.Source or SourceCatalog,
+#			or a string such as
+#			'08h37m05.6s+06d10m14.5s'
+#	observer	lineofsight.Observer or ObserverArray,
+#			or a pair of strings such as
+#			('52d54m54.6sn', '6d52m11.7se')
+#	times		UTC epochs (datetime64, datetime or
+#			ISO strings), one or an array of any
+#			length and cadence (see epochRange)
+#	ionex		IONEX file name (or an IONEXData), or an
+#			ionexseries.IONEXSeries for epochs
+#			spread over several days
+#	backend		IGRF implementation (see igrf.field)
+#	elevationMask	lowest altitude of the source (degrees)
+#			for which the RM is computed, 0 (the
+#			horizon) by default
+# Output:
+#	Prediction	with NumPy arrays of the TEC and RMS
+#			TEC along the line of sight (m^-2), the
+#			field along the line of sight (Gauss),
+#			the RM and its uncertainty (rad m^-2)
+#			and the coordinates of the IPP. Epochs
+#			with the source below the elevation mask
+#			are NaN.
+#
+# Usage:
+#	import ionrm
+#	p = ionrm.predict('08h37m05.6s+06d10m14.5s',
+#		('52d54m54.6sn', '6d52m11.7se'),
+#		numpy.datetime64('2011-10-20') + numpy.arange(24)*numpy.timedelta64(1, 'h'),
+#		'codg2930.11i')
+#	p.rm[p.visible]
+#
+#	times = ionrm.epochRange('2011-10-20T20:00:00', '2011-10-21T04:00:00', 10.0)
+#
+# stream() does the same for a range of epochs too long
+# to be held at once (e.g. a year every minute, or with
+# no end for real-time use): it yields one Prediction
+# per 'chunk' epochs, in time order, and only holds the
+# IONEX days around the current chunk, so a consumer
+# can write every chunk as it comes (see ionwriter and
+# ionstore).
+#
+#	for p in ionrm.stream(source, observer, '2011-01-01', 'codg0010.11i',
+#			end='2012-01-01', step=60.0):
+#		store.append(ionwriter.columns(p))
+#-----------------------------------------------------------
+
+import os
+import sys
+import math
+
+import numpy
+
+path = os.path.dirname(os.path.realpath(__file__))
+for package in ('SiderealPackage', 'PunctureIonosphereCoord', 'IONEX', 'IGRF'):
+	if os.path.join(path, package) not in sys.path:
+		sys.path.append(os.path.join(path, package))
+
+import altazarray
+import lineofsight
+import ippcoor_v1 as ippcoor
+import ionexcache
+import ionexseries
+import igrf
+
+# Defining some variables for further use
+TECU = pow(10,16)
+EarthRadius = 6371000.0 # in meters
+Tesla2Gauss = pow(10,4)
+RMCONSTANT = 2.6*pow(10,-17)
+
+# Number of epochs of the chunks of stream()
+chunkEpochs = 1440
+
+class Prediction(object):
+	"""Results of predict(), arrays of shape 'shape'.
+
+	times (datetime64), azimuth and altitude of the source
+	(radians), visible (altitude above the elevation mask),
+	ippLat and ippLon (degrees), ippAzimuth and ippZenith
+	(radians, of the line of sight at the IPP), tecPath and
+	rmsTecPath (m^-2), field (Gauss), rm and rmError (rad
+	m^-2), and ionHeight (km).
+	"""
+
+	def __init__(self, **values):
+		for name, value in values.items():
+			setattr(self, name, value)
+		self.shape = self.visible.shape
+
+def epochRange(start, end, step):
+	"""UTC epochs from 'start' to 'end' (included if it falls on
+	the cadence) every 'step' seconds (or timedelta64). Raise
+	ValueError if end is before start or step is not positive."""
+	start = numpy.datetime64(altazarray.utcEpochs(start)[0], 'us')
+	end = numpy.datetime64(altazarray.utcEpochs(end)[0], 'us')
+	step = _step(step)
+	if end < start:
+		raise ValueError('end is before start')
+	return numpy.arange(start, end + numpy.timedelta64(1, 'us'), step)
+
+def _step(step):
+	if not isinstance(step, numpy.timedelta64):
+		step = numpy.timedelta64(int(round(float(step)*1e6)), 'us')
+	step = step.astype('timedelta64[us]')
+	if step <= numpy.timedelta64(0, 'us'):
+		raise ValueError('step must be positive')
+	return step
+
+def _source(source):
+	if isinstance(source, str):
+		return lineofsight.Source.fromString(source)
+	return source
+
+def _observer(observer):
+	if isinstance(observer, (tuple, list)) and len(observer) == 2 and isinstance(observer[0], str):
+		return lineofsight.Observer.fromStrings(observer[0], observer[1])
+	return observer
+
+def predict(source, observer, times, ionex, backend=None, elevationMask=0.0):
+
+	source = _source(source)
+	observer = _observer(observer)
+	if isinstance(ionex, ionexseries.IONEXSeries):
+		data = ionex
+	else:
+		data = ionexcache.getIONEX(ionex)
+
+	# RA and Dec (of the source) to Alt and Az (radians)
+	utc = altazarray.utcEpochs(times)
+	if numpy.ndim(times) == 0:
+		utc = utc.reshape(())
+	AzS, AlS, HA, LatO, LonO = altazarray.horizon(source, observer, utc)
+	shape = AzS.shape
+	utc = numpy.broadcast_to(utc, shape)
+	visible = AlS > math.radians(elevationMask)
+
+	ippLat = numpy.full(shape, numpy.nan)
+	ippLon = numpy.full(shape, numpy.nan)
+	AzPunct = numpy.full(shape, numpy.nan)
+	ZenPunct = numpy.full(shape, numpy.nan)
+	TECpath = numpy.full(shape, numpy.nan)
+	RMSTECpath = numpy.full(shape, numpy.nan)
+	Totfield = numpy.full(shape, numpy.nan)
+
+	# Altitude of the Ionosphere (from the IONEX file)
+	AltIon = data.ionHeight()*1000.0 # km to m
+
+	if visible.any():
+		# Alt and Az coordinates of the Ionospheric piercing point and
+		# Lat and Lon offsets wrt the location of the antenna (radians)
+		offLat, offLon, AzPunct[visible], ZenPunct[visible] = ippcoor.PuncIonOffsetArray(
+			LatO[visible], AzS[visible], (math.pi/2.0) - AlS[visible], AltIon)
+		ippLat[visible] = numpy.degrees(LatO[visible] + offLat)
+		ippLon[visible] = (numpy.degrees(LonO[visible] + offLon) + 180.0) % 360.0 - 180.0
+
+		# TEC and RMS TEC along the line of sight
+		TEC2m2 = pow(10.0, data.exponent)*TECU
+		VTEC, VRMSTEC = ionexseries.lookupTEC(data, utc[visible], ippLat[visible], ippLon[visible])
+		TECpath[visible] = VTEC*TEC2m2/numpy.cos(ZenPunct[visible])
+		if VRMSTEC is not None:
+			RMSTECpath[visible] = VRMSTEC*TEC2m2/numpy.cos(ZenPunct[visible])
+
+		# Total magnetic field along the line of sight at the IPP
+		Xfield, Yfield, Zfield = igrf.field(utc[visible].astype('datetime64[D]'), ippLat[visible],
+			ippLon[visible], (EarthRadius + AltIon)/1000.0, backend=backend)
+		Xfield = numpy.abs(Xfield)*pow(10,-9)*Tesla2Gauss
+		Yfield = numpy.abs(Yfield)*pow(10,-9)*Tesla2Gauss
+		Zfield = numpy.abs(Zfield)*pow(10,-9)*Tesla2Gauss
+		Z = ZenPunct[visible]
+		A = AzPunct[visible]
+		Totfield[visible] = Zfield*numpy.cos(Z) + Yfield*numpy.sin(Z)*numpy.sin(A) - Xfield*numpy.sin(Z)*numpy.cos(A)
+
+	# Ionospheric RM and its uncertainty
+	IFR = RMCONSTANT*Totfield*TECpath
+	RMSIFR = RMCONSTANT*Totfield*RMSTECpath
+
+	return Prediction(times=utc, azimuth=AzS, altitude=AlS, visible=visible,
+		ippLat=ippLat, ippLon=ippLon, ippAzimuth=AzPunct, ippZenith=ZenPunct,
+		tecPath=TECpath, rmsTecPath=RMSTECpath, field=Totfield, rm=IFR, rmError=RMSIFR,
+		ionHeight=AltIon/1000.0)
+
+def stream(source, observer, start, ionex, end=None, step=60.0, chunk=None, backend=None, elevationMask=0.0):
+	"""Generator of the Predictions of the epochs from 'start' to
+	'end' (included if it falls on the cadence; never ending if
+	None) every 'step' seconds, 'chunk' epochs (chunkEpochs by
+	default) at a time.
+
+	ionex is the IONEX file of any day (the files of the other
+	days are found next to it) or an ionexseries.IONEXSeries.
+	The days before the current chunk are forgotten as the
+	stream goes on, and days without a file are looked for
+	again at every chunk, so files that appear later are used.
+	"""
+	if chunk is None:
+		chunk = chunkEpochs
+	chunk = int(chunk)
+	if chunk < 1:
+		raise ValueError('chunk must be at least 1')
+	source = _source(source)
+	observer = _observer(observer)
+	if not isinstance(ionex, ionexseries.IONEXSeries):
+		ionex = ionexseries.IONEXSeries(ionex)
+	start = numpy.datetime64(altazarray.utcEpochs(start)[0], 'us')
+	if end is not None:
+		end = numpy.datetime64(altazarray.utcEpochs(end)[0], 'us')
+	step = _step(step)
+
+	first = 0
+	while True:
+		times = start + (first + numpy.arange(chunk))*step
+		if end is not None:
+			times = times[times <= end]
+			if len(times) == 0:
+				return
+		# only the day before the chunk can still be needed (its
+		# maps may be stitched before the first map of the day)
+		ionex.forget(times[0].astype('datetime64[D]') - numpy.timedelta64(1, 'D'))
+		yield predict(source, observer, times, ionex, backend, elevationMask)
+		first += chunk
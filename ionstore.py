@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------
+# Chunked columnar store of ionospheric RM results.
+# @version 1.0
+#
+# A ColumnStore is a directory with one raw binary file
+# per column of ionwriter.COLUMNS (<column>.bin, little
+# endian) and an index (index.json) holding the number
+# of rows, the names of the stations and sources the
+# 'station' and 'source' columns refer to, and the list
+# of chunks: the first row, the number of rows and the
+# first and last epoch of every chunk.
+#
+# append() adds the columns of a prediction (see
+# ionwriter.columns) at the end of every file, as new
+# chunks of at most 'chunkRows' rows sorted by epoch,
+# and then replaces the index; the names of its stations
+# and sources are matched with (or added to) those of
+# the store. Rows beyond the count of the index (left by
+# an append that was interrupted) are dropped by the
+# next append, and readers never see them. Appends from
+# several processes are serialized with a lock file.
+#
+# read() memory-maps the files and returns only the rows
+# of the chunks that overlap the time range requested,
+# so a slice of a long series is read without reading
+# the rest. When the chunks were appended in time order
+# the rows returned are views of the files, not copies.
+#
+# Usage:
+#	store = ionstore.ColumnStore('campaign.rm')
+#	store.append(ionwriter.columns(prediction, sources=catalog.names))
+#	c = store.read('2011-10-20T06:00', '2011-10-20T12:00')
+#	c['rm'], c['sourceNames']
+#-----------------------------------------------------------
+
+import os
+import json
+import fcntl
+import tempfile
+
+import numpy
+
+import ionwriter
+
+# Largest number of rows of a chunk
+chunkRows = 1 << 20
+
+INDEX = 'index.json'
+LOCK = '.lock'
+VERSION = 1
+
+def _dtype(kind):
+	return numpy.dtype(kind).newbyteorder('<')
+
+class ColumnStore(object):
+	"""Results appended to the directory 'path' (made if needed)."""
+
+	def __init__(self, path):
+		self.path = os.path.abspath(path)
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path)
+
+	def _file(self, name):
+		return os.path.join(self.path, name + '.bin')
+
+	def index(self):
+		"""Contents of the index (an empty store if there is none)."""
+		try:
+			f = open(os.path.join(self.path, INDEX), 'r')
+		except (IOError, OSError):
+			return {'version': VERSION, 'columns': ionwriter.COLUMNS, 'rows': 0, 'chunks': [],
+				'stationNames': [], 'sourceNames': []}
+		try:
+			index = json.load(f)
+		finally:
+			f.close()
+		if index.get('version') != VERSION:
+			raise ValueError('%s: unknown store version %r' % (self.path, index.get('version')))
+		return index
+
+	def __len__(self):
+		return self.index()['rows']
+
+	def _writeIndex(self, index):
+		fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.' + INDEX + '.', suffix='.tmp')
+		try:
+			f = os.fdopen(fd, 'w')
+			try:
+				json.dump(index, f)
+				f.flush()
+				os.fsync(f.fileno())
+			finally:
+				f.close()
+			os.chmod(tmp, ionwriter.fileMode())
+			os.replace(tmp, os.path.join(self.path, INDEX))
+		except BaseException:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+			raise
+
+	def append(self, columns):
+		"""Add the rows of ionwriter.columns() to the store."""
+		lock = open(os.path.join(self.path, LOCK), 'a')
+		try:
+			fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+			index = self.index()
+			rows = index['rows']
+			n = len(columns['epoch'])
+			if n == 0:
+				return
+
+			# ids of the prediction -> ids of the store
+			data = {}
+			for what in ('station', 'source'):
+				names = index[what + 'Names']
+				known = dict([(name, k) for k, name in enumerate(names)])
+				ids = []
+				for name in columns[what + 'Names']:
+					if name not in known:
+						known[name] = len(names)
+						names.append(name)
+					ids.append(known[name])
+				data[what] = numpy.asarray(ids, dtype=numpy.int32)[columns[what]]
+
+			order = numpy.argsort(columns['epoch'], kind='stable')
+			for name, kind in index['columns']:
+				if name not in data:
+					data[name] = numpy.asarray(columns[name]).astype(kind)
+				data[name] = numpy.ascontiguousarray(data[name][order], dtype=_dtype(kind))
+
+			for name, kind in index['columns']:
+				f = open(self._file(name), 'ab')
+				try:
+					# drop what an interrupted append may have left
+					f.truncate(rows*_dtype(kind).itemsize)
+					f.write(data[name].tobytes())
+					f.flush()
+					os.fsync(f.fileno())
+				finally:
+					f.close()
+
+			epochs = data['epoch'].astype(numpy.int64)
+			for start in range(0, n, max(1, int(chunkRows))):
+				end = min(n, start + max(1, int(chunkRows)))
+				index['chunks'].append({'start': rows + start, 'rows': end - start,
+					'first': int(epochs[start]), 'last': int(epochs[end-1])})
+			index['rows'] = rows + n
+			self._writeIndex(index)
+		finally:
+			lock.close()
+
+	def read(self, start=None, end=None, names=None):
+		"""Columns of the rows with start <= epoch < end (either can
+		be None), as a dict of arrays plus 'stationNames' and
+		'sourceNames'. 'names' restricts the columns returned."""
+		index = self.index()
+		kinds = dict([(name, kind) for name, kind in index['columns']])
+		if names is None:
+			names = [name for name, kind in index['columns']]
+		lo = numpy.iinfo(numpy.int64).min
+		hi = numpy.iinfo(numpy.int64).max
+		if start is not None:
+			lo = int(numpy.datetime64(start, 'ms').astype(numpy.int64))
+		if end is not None:
+			hi = int(numpy.datetime64(end, 'ms').astype(numpy.int64))
+
+		chunks = [c for c in index['chunks'] if c['last'] >= lo and c['first'] < hi]
+		result = {'stationNames': index['stationNames'], 'sourceNames': index['sourceNames']}
+		if not chunks:
+			for name in names:
+				result[name] = numpy.empty(0, dtype=_dtype(kinds[name]))
+			return result
+
+		def column(name):
+			return numpy.memmap(self._file(name), dtype=_dtype(kinds[name]), mode='r', shape=(index['rows'],))
+
+		epoch = column('epoch').view(numpy.int64)
+		ordered = all([index['chunks'][k]['first'] >= index['chunks'][k-1]['last']
+			for k in range(1, len(index['chunks']))])
+		if ordered:
+			# the rows of the chunks are sorted: one contiguous slice
+			first = chunks[0]['start']
+			last = chunks[-1]['start'] + chunks[-1]['rows']
+			part = epoch[first:last]
+			rows = slice(first + int(numpy.searchsorted(part, numpy.int64(lo), side='left')),
+				first + int(numpy.searchsorted(part, numpy.int64(hi), side='left')))
+		else:
+			rows = numpy.concatenate([numpy.arange(c['start'], c['start'] + c['rows']) for c in chunks])
+			rows = rows[(epoch[rows] >= lo) & (epoch[rows] < hi)]
+		for name in names:
+			result[name] = column(name)[rows]
+		return result
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------
+# Writing the results of ionrm.predict() to files.
+# @version 1.0
+#
+# textRows() turns a Prediction into the rows of
+# IonRM.txt: for every sample with the source above the
+# elevation mask, the time (the hour of the day, or the
+# full UT date and time), the TEC along the line of
+# sight, the field along the line of sight, the RM and
+# its uncertainty, optionally after the names of the
+# station and the source.
+#
+# A ResultWriter collects rows in memory and in a
+# private temporary file next to its output file, and
+# only touches the output file when it is closed: the
+# temporary file is then renamed over it (so readers
+# see either the old file or the whole new one, never a
+# part of it), or, with append=True, its contents are
+# added to the end of the output file in one write
+# while holding a lock on it (so concurrent runs never
+# interleave their rows). If the writer is not closed
+# properly (an error in a 'with' block) the output file
+# is left untouched.
+#
+# For large campaigns the same samples can be kept as
+# typed columns instead of text (see columns()):
+# writeNPZ() writes them to a NumPy .npz file (also
+# replaced only once complete), and ionstore.ColumnStore
+# appends them to a chunked store that can be memory
+# mapped and sliced by time.
+#
+# Usage:
+#	with ionwriter.ResultWriter('IonRM.txt') as w:
+#		w.write(prediction)
+#
+#	ionwriter.writeNPZ('rm.npz', prediction, sources=catalog.names)
+#	c = numpy.load('rm.npz')
+#	c['rm'][c['source'] == 3]
+#-----------------------------------------------------------
+
+import os
+import fcntl
+import shutil
+import tempfile
+
+import numpy
+
+# Rows kept in memory before they are written to the
+# temporary file
+bufferRows = 65536
+
+# umask of the process, read once (setting it is not thread safe)
+_umask = os.umask(0)
+os.umask(_umask)
+
+def _name(name):
+	return '_'.join(str(name).split())
+
+def textRows(prediction, stamps='hour', labels=()):
+	"""Rows (strings ending in a newline) of a Prediction.
+
+	stamps is 'hour' for the hour of the day (as ionFRM.py
+	writes for a day) or 'iso' for the full UT date and time.
+	labels holds, for the leading axes of the prediction (e.g.
+	stations and sources), a list of names written at the start
+	of every row, or None to leave that axis out.
+	"""
+	visible = numpy.asarray(prediction.visible)
+	times = numpy.broadcast_to(prediction.times, visible.shape)
+	columns = [prediction.tecPath, prediction.field, prediction.rm, prediction.rmError]
+	labels = list(labels)
+
+	rows = []
+	for k in zip(*numpy.nonzero(visible)):
+		t = times[k]
+		if stamps == 'hour':
+			stamp = '%02d' % ((t - t.astype('datetime64[D]'))//numpy.timedelta64(1, 'h'))
+		else:
+			stamp = str(t.astype('datetime64[s]'))
+		prefix = ''
+		for axis, names in enumerate(labels):
+			if names is not None:
+				prefix = prefix + _name(names[k[axis]]) + ' '
+		rows.append(''+prefix+stamp+' '+' '.join([str(float(c[k])) for c in columns])+'\n')
+	return rows
+
+# Columns of columns(), and their types
+COLUMNS = [('epoch', 'datetime64[ms]'), ('station', 'int32'), ('source', 'int32'),
+	('tecPath', 'float64'), ('field', 'float64'), ('rm', 'float64'), ('rmError', 'float64'),
+	('ippLat', 'float64'), ('ippLon', 'float64')]
+
+def columns(prediction, stations=None, sources=None):
+	"""Typed columns of the samples of a Prediction with the
+	source above the elevation mask, in the order of textRows().
+
+	stations (sources) is the list of names of the first (next)
+	axis of the prediction, or a single name (or None) when the
+	prediction has no axis of stations (sources). Returns a dict
+	of 1-D arrays (see COLUMNS; station and source are indices
+	in 'stationNames' and 'sourceNames', also in the dict).
+	"""
+	visible = numpy.asarray(prediction.visible)
+	index = numpy.nonzero(visible)
+	axis = 0
+	result = {}
+	for what, names in (('station', stations), ('source', sources)):
+		if isinstance(names, (list, tuple, numpy.ndarray)):
+			result[what] = index[axis].astype(numpy.int32)
+			result[what + 'Names'] = [str(n) for n in names]
+			axis += 1
+		else:
+			result[what] = numpy.zeros(len(index[0]), dtype=numpy.int32)
+			if names is None:
+				names = ''
+			result[what + 'Names'] = [str(names)]
+	result['epoch'] = numpy.broadcast_to(prediction.times, visible.shape)[index].astype('datetime64[ms]')
+	for what in ('tecPath', 'field', 'rm', 'rmError', 'ippLat', 'ippLon'):
+		result[what] = numpy.asarray(getattr(prediction, what), dtype=numpy.float64)[index]
+	return result
+
+def writeNPZ(path, prediction, stations=None, sources=None, compressed=False):
+	"""Write the columns() of a Prediction to a .npz file,
+	replacing 'path' only once it is complete."""
+	path = os.path.abspath(path)
+	c = columns(prediction, stations, sources)
+	c['stationNames'] = numpy.array(c['stationNames'], dtype=str)
+	c['sourceNames'] = numpy.array(c['sourceNames'], dtype=str)
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+	try:
+		f = os.fdopen(fd, 'wb')
+		try:
+			if compressed:
+				numpy.savez_compressed(f, **c)
+			else:
+				numpy.savez(f, **c)
+		finally:
+			f.close()
+		os.chmod(tmp, fileMode())
+		os.replace(tmp, path)
+	except BaseException:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		raise
+
+class ResultWriter(object):
+	"""Rows of results for one output file, written when the
+	writer is closed."""
+
+	def __init__(self, path, append=False):
+		self.path = os.path.abspath(path)
+		self.append = append
+		self.rows = []
+		self._tmp = None
+		self._file = None
+		self.closed = False
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, kind, value, traceback):
+		if kind is None:
+			self.close()
+		else:
+			self.abort()
+		return False
+
+	def addRows(self, rows):
+		"""Add rows (strings ending in a newline)."""
+		if self.closed:
+			raise ValueError('the writer of %s is closed' % self.path)
+		self.rows.extend(rows)
+		if len(self.rows) >= bufferRows:
+			self._spill()
+
+	def write(self, prediction, stamps='hour', labels=()):
+		"""Add the rows of a Prediction (see textRows)."""
+		self.addRows(textRows(prediction, stamps, labels))
+
+	def _spill(self):
+		if self._file is None:
+			fd, self._tmp = tempfile.mkstemp(dir=os.path.dirname(self.path),
+				prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp')
+			self._file = os.fdopen(fd, 'w')
+		self._file.writelines(self.rows)
+		self.rows = []
+
+	def close(self):
+		"""Write the rows to the output file."""
+		if self.closed:
+			return
+		try:
+			if self.append and self._file is None:
+				# everything is still in memory: appended directly (if
+				# there is anything, so that no empty file is made)
+				if self.rows:
+					self._append(self.rows)
+			else:
+				self._spill()
+				self._file.close()
+				self._file = None
+				if self.append:
+					f = open(self._tmp, 'r')
+					try:
+						self._append([], f)
+					finally:
+						f.close()
+					os.remove(self._tmp)
+				else:
+					os.chmod(self._tmp, fileMode())
+					os.replace(self._tmp, self.path)
+				self._tmp = None
+		except BaseException:
+			self.abort()
+			raise
+		self.rows = []
+		self.closed = True
+
+	def _append(self, rows, source=None):
+		# rows, or the contents of the file 'source' (copied a block
+		# at a time), added to the locked output file
+		f = open(self.path, 'a')
+		try:
+			fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+			if source is not None:
+				shutil.copyfileobj(source, f)
+			f.writelines(rows)
+			f.flush()
+		finally:
+			f.close()
+
+	def abort(self):
+		"""Drop the rows, leaving the output file as it was."""
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+		if self._tmp is not None and os.path.exists(self._tmp):
+			os.remove(self._tmp)
+		self._tmp = None
+		self.rows = []
+		self.closed = True
+
+def fileMode():
+	"""Permissions of a new file (the temporary files are made
+	private to the user)."""
+	return 0o666 & ~_umask